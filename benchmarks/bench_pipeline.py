@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Offline throughput benchmark: process_filings_for_cik against a local EDGAR stand-in.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--scenarios small,mixed] [--repeat N] [--workers N]
+    python benchmarks/bench_pipeline.py --save-baseline          # store these results as the baseline
+    python benchmarks/bench_pipeline.py --fixtures DIR           # recorded responses instead of synthetic ones
+
+Each scenario writes synthetic 10-K/10-Q fixtures (HTML size and image count
+per filing, see SCENARIOS) and serves them from `edgar_stub.EdgarStub` with
+the scenario's latency and 429 rate. Every repeat runs the whole pipeline
+(download_and_process, assets, convert_to_pdf_weasyprint) in a fresh child
+process with empty caches, so peak RSS is per run and nothing leaks between
+runs. Nothing leaves the machine: the pipeline is pointed at the stub through
+SEC_SUBMISSIONS_BASE_URL / SEC_ARCHIVES_BASE_URL, and requests are paced by the
+real rate governor (8 req/s unless --rate is given).
+
+Per scenario it reports filings/minute (PDFs produced; failed filings don't
+count), the share of filings that produced a PDF, p50/p95 of every stage from
+sec_metrics and peak RSS, and compares them with the stored baseline
+(benchmarks/pipeline_baseline.json, or --baseline). The exit status is 1 if
+fewer filings produced a PDF than in the baseline, if throughput dropped, or a
+stage's median, the end-to-end filing p95 or peak RSS grew, by more than --tolerance. Baselines are machine-specific:
+record one with --save-baseline on the machine that runs the comparison.
+Without WeasyPrint every render fails immediately, so the render stage is
+not measured (reported as such) and throughput is zero.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from edgar_stub import EdgarStub, write_synthetic_fixtures  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipeline_baseline.json')
+DEFAULT_TOLERANCE = 0.25 # Relative change that counts as a regression (governor pacing makes timings noisy)
+MIN_STAGE_DELTA = 0.05 # Seconds; smaller increases are noise
+MIN_RSS_DELTA_MB = 20
+CHILD_TIMEOUT = 1800
+
+# html_bytes / images cycle over the filings, so tuples give a mix of sizes
+SCENARIOS = {
+    'small': dict(companies=1, filings=12, html_bytes=(60_000,), images=(1,), latency_ms=30, jitter_ms=10, throttle_rate=0.0),
+    'mixed': dict(companies=2, filings=8, html_bytes=(60_000, 400_000, 1_500_000), images=(1, 6, 15), latency_ms=50, jitter_ms=20, throttle_rate=0.0),
+    'assets': dict(companies=1, filings=4, html_bytes=(300_000,), images=(40,), latency_ms=50, jitter_ms=20, throttle_rate=0.0),
+    'throttled': dict(companies=1, filings=8, html_bytes=(200_000,), images=(4,), latency_ms=50, jitter_ms=20, throttle_rate=0.05),
+}
+
+
+# --- Child process: one measured run ---
+
+def run_child(config):
+    """Runs the pipeline for `config['ciks']` and returns the measurements (called in the child process)."""
+    from sec_metrics import RunMetrics, stage_stats
+    from sec_pipeline import process_filings_for_cik
+    from sec_render import weasyprint_version
+    if config.get('rate'):
+        import sec_http
+        sec_http.SEC_RATE_LIMITER = sec_http.RateGovernor(config['rate'])
+    quiet = lambda message, level="info", exc=None: None
+    def run_all():
+        runs = []
+        for cik in config['ciks']:
+            runs.append(RunMetrics(cik))
+            _, pdf_dir = process_filings_for_cik(cik, '', 12, 'Same Year', True, max_workers=config['workers'],
+                                                 max_filings=config['max_filings'], metrics=runs[-1], progress=quiet)
+            if pdf_dir: shutil.rmtree(pdf_dir, ignore_errors=True)
+        return runs
+    if config.get('warm'): run_all() # Fill the caches first; only the second pass is measured
+    start = time.perf_counter()
+    runs = run_all()
+    wall = time.perf_counter() - start
+    samples = {}; outcomes = {}
+    for metrics in runs:
+        for name, values in metrics.stage_samples().items(): samples.setdefault(name, []).extend(values)
+        for outcome, count in metrics.summary()['filings'].items(): outcomes[outcome] = outcomes.get(outcome, 0) + count
+    summaries = [metrics.summary() for metrics in runs]
+    done = outcomes.get('done', 0)
+    return dict(wall_seconds=wall, filings=outcomes, filings_per_minute=done / wall * 60 if wall > 0 else 0.0,
+                samples=samples, stages={name: stage_stats(values) for name, values in samples.items()},
+                peak_rss_mb=max(summary['peak_rss_mb'] for summary in summaries),
+                render_worker_peak_rss_mb=max((summary['render_worker_peak_rss_mb'] or 0.0) for summary in summaries),
+                weasyprint=weasyprint_version())
+
+
+def spawn_child(config, stub, cache_dir):
+    env = dict(os.environ, **stub.environ(), SEC_CACHE_DIR=cache_dir)
+    env.pop('SEC_RATE_STATE_FILE', None) # Never share a governor with real deployments
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', json.dumps(config)],
+                          env=env, capture_output=True, text=True, timeout=CHILD_TIMEOUT)
+    if proc.returncode != 0:
+        raise RuntimeError(f"benchmark child failed ({proc.returncode}):\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+# --- Parent: scenarios, report, baseline ---
+
+def run_scenario(name, scenario, args):
+    """Generates (or uses recorded) fixtures, serves them and runs `args.repeat` cold child runs. Returns the aggregated result."""
+    from sec_metrics import percentile
+    work_dir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    try:
+        if args.fixtures:
+            root = args.fixtures
+            ciks = sorted(f[3:13] for f in os.listdir(os.path.join(root, 'submissions')) if f.startswith('CIK') and len(f) == 18)
+        else:
+            root = os.path.join(work_dir, 'fixtures')
+            ciks = write_synthetic_fixtures(root, scenario['companies'], scenario['filings'], tuple(scenario['html_bytes']),
+                                            tuple(scenario['images']), seed=args.seed)
+        stub = EdgarStub(root, scenario['latency_ms'] / 1000, scenario['jitter_ms'] / 1000, scenario['throttle_rate'], seed=args.seed)
+        config = dict(ciks=ciks, workers=args.workers, max_filings=args.max_filings, rate=args.rate, warm=args.warm)
+        runs = []
+        with stub:
+            for repeat in range(args.repeat):
+                runs.append(spawn_child(config, stub, os.path.join(work_dir, f"cache{repeat}")))
+    finally: shutil.rmtree(work_dir, ignore_errors=True)
+    samples = {}
+    for run in runs:
+        for stage, values in run['samples'].items(): samples.setdefault(stage, []).extend(values)
+    config = json.loads(json.dumps(dict(scenario, workers=args.workers, rate=args.rate, warm=args.warm, fixtures=bool(args.fixtures)))) # As stored in the baseline
+    return dict(config=config,
+                filings_per_minute=statistics.median(run['filings_per_minute'] for run in runs),
+                wall_seconds=statistics.median(run['wall_seconds'] for run in runs),
+                pdfs=sum(run['filings'].get('done', 0) for run in runs), filings=sum(sum(run['filings'].values()) for run in runs),
+                stages={stage: dict(count=len(values), p50=percentile(values, 50), p95=percentile(values, 95)) for stage, values in sorted(samples.items())},
+                peak_rss_mb=max(run['peak_rss_mb'] for run in runs),
+                render_worker_peak_rss_mb=max(run['render_worker_peak_rss_mb'] for run in runs),
+                weasyprint=runs[0]['weasyprint'], http=dict(stub.stats))
+
+
+def compare(result, base, tolerance=DEFAULT_TOLERANCE):
+    """Regressions of `result` against baseline entry `base`, as messages ([] if none)."""
+    regressions = []
+    if result['filings'] and base['filings'] and result['pdfs'] / result['filings'] < base['pdfs'] / base['filings']:
+        regressions.append(f"PDFs produced {base['pdfs']}/{base['filings']} -> {result['pdfs']}/{result['filings']}")
+    if result['filings_per_minute'] < base['filings_per_minute'] * (1 - tolerance):
+        regressions.append(f"throughput {base['filings_per_minute']:.1f} -> {result['filings_per_minute']:.1f} filings/min")
+    if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance) and result['peak_rss_mb'] - base['peak_rss_mb'] > MIN_RSS_DELTA_MB:
+        regressions.append(f"peak RSS {base['peak_rss_mb']:.0f} -> {result['peak_rss_mb']:.0f} MB")
+    # Stage medians are stable enough to compare; for tails only the end-to-end filing p95 is. Gate waits
+    # measure contention, which throughput already covers.
+    checks = [(stage, 'p50') for stage in result['stages'] if not stage.endswith('_wait')] + [('filing', 'p95')]
+    for stage, key in checks:
+        before = base['stages'].get(stage, {}).get(key); after = result['stages'].get(stage, {}).get(key)
+        if before is not None and after is not None and after > before * (1 + tolerance) and after - before > MIN_STAGE_DELTA:
+            regressions.append(f"{stage} {key} {before:.3f}s -> {after:.3f}s")
+    return regressions
+
+
+def print_result(name, result, base):
+    http = result['http']
+    print(f"\n== {name}: {result['filings_per_minute']:.1f} filings/min ({result['pdfs']}/{result['filings']} PDFs), "
+          f"median wall {result['wall_seconds']:.1f}s, peak RSS {result['peak_rss_mb']:.0f} MB (render workers {result['render_worker_peak_rss_mb']:.0f} MB), "
+          f"{http['requests']} requests ({http['throttled']} x 429)")
+    if not result['weasyprint']: print("   WeasyPrint not installed: render stage not measured")
+    print(f"   {'stage':16} {'count':>6} {'p50 s':>8} {'p95 s':>8} {'base p50':>9} {'base p95':>9}")
+    for stage, stats in result['stages'].items():
+        before = base['stages'].get(stage) if base else None
+        baseline_cols = f"{before['p50']:9.3f} {before['p95']:9.3f}" if before else ''
+        print(f"   {stage:16} {stats['count']:6d} {stats['p50']:8.3f} {stats['p95']:8.3f} {baseline_cols}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument('--repeat', type=int, default=3, help="Cold runs per scenario (default: 3)")
+    parser.add_argument('--workers', type=int, default=4, help="max_workers for process_filings_for_cik (default: 4)")
+    parser.add_argument('--max-filings', type=int, default=100)
+    parser.add_argument('--rate', type=float, help="Requests/s for the rate governor (default: production limit)")
+    parser.add_argument('--warm', action='store_true', help="Measure a second pass over warm caches")
+    parser.add_argument('--fixtures', metavar='DIR', help="Serve recorded fixtures (DIR/submissions, DIR/Archives/edgar/data) as scenario 'recorded'")
+    parser.add_argument('--latency-ms', type=float, help="Override the scenarios' per-request latency")
+    parser.add_argument('--jitter-ms', type=float, help="Override the scenarios' latency jitter")
+    parser.add_argument('--throttle-rate', type=float, help="Override the scenarios' fraction of 429 responses")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON file (default: benchmarks/pipeline_baseline.json)")
+    parser.add_argument('--save-baseline', action='store_true', help="Write these results to the baseline file")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="Allowed relative slowdown (default: 0.25)")
+    parser.add_argument('--json', metavar='FILE', help="Also write the results to FILE")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        print(json.dumps(run_child(json.loads(args.child)))); return 0
+
+    if args.fixtures: scenarios = {'recorded': dict(latency_ms=50, jitter_ms=20, throttle_rate=0.0)}
+    else:
+        unknown = [name for name in args.scenarios.split(',') if name not in SCENARIOS]
+        if unknown: parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+        scenarios = {name: dict(SCENARIOS[name]) for name in args.scenarios.split(',')}
+    for scenario in scenarios.values():
+        for option in ('latency_ms', 'jitter_ms', 'throttle_rate'):
+            if getattr(args, option) is not None: scenario[option] = getattr(args, option)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f: baseline = json.load(f).get('scenarios', {})
+    results = {}; failures = {}
+    for name, scenario in scenarios.items():
+        result = results[name] = run_scenario(name, scenario, args)
+        base = baseline.get(name)
+        comparable = base is not None and base['config'] == result['config']
+        print_result(name, result, base if comparable else None)
+        if comparable:
+            regressions = compare(result, base, args.tolerance)
+            if regressions: failures[name] = regressions
+            print("   REGRESSION: " + "; ".join(regressions) if regressions else "   OK: within tolerance of baseline")
+        elif args.save_baseline: pass
+        elif base is not None: print(f"   (baseline for {name} used different settings; not compared)")
+        else: print(f"   (no baseline for {name} in {args.baseline})")
+
+    meta = dict(python=platform.python_version(), platform=platform.platform(), cpus=os.cpu_count(), created=time.strftime('%Y-%m-%dT%H:%M:%S'))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f: json.dump(dict(meta=meta, scenarios=results), f, indent=2)
+    if args.save_baseline:
+        saved = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f: saved = json.load(f).get('scenarios', {})
+        saved.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f: json.dump(dict(meta=meta, scenarios=saved), f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+    return 1 if failures and not args.save_baseline else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
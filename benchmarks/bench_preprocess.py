@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: legacy preprocessing vs sec_preprocess.preprocess_html.
+
+Usage:
+    python benchmarks/bench_preprocess.py [FILE_OR_DIR ...] [--repeat N]
+
+Pass saved 10-K/10-Q primary documents (e.g. aapl-20230930.htm) or folders of
+them. Without arguments a synthetic filing with tables, images and mojibake is
+generated. For each sample the median time of the legacy path (six
+str.replace scans + 'html.parser' + a second find_all walk) is compared with
+the new engine on every installed parser backend.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+from sec_preprocess import available_parsers, collect_asset_refs, preprocess_html  # noqa: E402
+
+
+def legacy_preprocess(decoded_text):
+    """The original download_and_process + download_assets tree work, kept for comparison."""
+    replacements = { "â€": "\"", "â€œ": "\"", "â€™": "'", "â€˜": "'", "â€“": "-", "â€”": "-" }
+    for wrong, correct in replacements.items(): decoded_text = decoded_text.replace(wrong, correct)
+    soup = BeautifulSoup(decoded_text, 'html.parser')
+    meta_charset = soup.find('meta', charset=True)
+    if not meta_charset:
+        meta = soup.new_tag('meta', charset='UTF-8')
+        if soup.head: soup.head.insert(0, meta)
+        else: head = soup.new_tag('head'); head.append(meta); soup.insert(0, head)
+    elif meta_charset['charset'].lower() != 'utf-8': meta_charset['charset'] = 'UTF-8'
+    return soup, collect_asset_refs(soup)
+
+
+def synthetic_filing(tables=400, rows=20):
+    parts = ['<html><head><title>FORM 10-K</title><link rel="stylesheet" href="style.css"></head><body>']
+    for t in range(tables):
+        parts.append(f'<h2>Item {t % 15 + 1}. Section {t}</h2><p>The Companyâ€™s results â€œimprovedâ€ â€” see Note {t}.</p>')
+        if t % 10 == 0: parts.append(f'<img src="img{t}.jpg" alt="chart {t}">')
+        parts.append('<table>')
+        for r in range(rows):
+            parts.append(f'<tr><td style="padding:2px">Line item {r}</td><td>$ {r * 1000 + t:,}</td><td>({r + t})</td></tr>')
+        parts.append('</table>')
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+
+def load_samples(paths):
+    samples = []
+    for path in paths:
+        files = [os.path.join(path, f) for f in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+        for f in files:
+            if os.path.isfile(f):
+                with open(f, 'rb') as fh: samples.append((os.path.basename(f), fh.read().decode('utf-8', errors='replace')))
+    return samples or [('synthetic', synthetic_filing())]
+
+
+def time_it(fn, text, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter(); fn(text); times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', help="Filing HTML files or directories")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+    backends = available_parsers()
+    print(f"{'sample':30} {'size MB':>8} {'legacy s':>9} " + ' '.join(f"{b + ' s':>15} {'x':>5}" for b in backends))
+    for name, text in load_samples(args.paths):
+        legacy = time_it(legacy_preprocess, text, args.repeat)
+        cols = []
+        for backend in backends:
+            t = time_it(lambda txt: preprocess_html(txt, backend), text, args.repeat)
+            cols.append(f"{t:15.3f} {legacy / t:5.1f}")
+        print(f"{name[:30]:30} {len(text.encode('utf-8')) / 1e6:8.2f} {legacy:9.3f} " + ' '.join(cols))
+
+
+if __name__ == '__main__':
+    main()
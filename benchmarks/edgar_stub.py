@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for SEC EDGAR, for offline benchmarks.
+
+`EdgarStub` serves a fixture directory laid out like the real hosts:
+
+    ROOT/submissions/CIK##########.json        (data.sec.gov/submissions/...)
+    ROOT/Archives/edgar/data/{cik}/{acc}/...   (www.sec.gov/Archives/edgar/data/...)
+
+so recorded responses can be dropped in as-is. `write_synthetic_fixtures`
+generates such a tree: companies with 10-K/10-Q filings of a given size and
+number of images (real, incompressible PNGs), deterministic per seed.
+
+Every response is delayed by `latency` (+ uniform `jitter`) seconds, and a
+`throttle_rate` fraction of requests gets a 429 with `Retry-After`, like
+EDGAR's fair-access limiter. Submissions support If-None-Match (ETag) so the
+revalidating cache sees 304s. Point the pipeline at the stub with
+`stub.environ()` (SEC_SUBMISSIONS_BASE_URL / SEC_ARCHIVES_BASE_URL).
+
+    python benchmarks/edgar_stub.py --port 8765   # serve synthetic fixtures
+"""
+import argparse
+import hashlib
+import json
+import mimetypes
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+SUBMISSIONS_PREFIX = '/submissions/'
+ARCHIVES_PREFIX = '/Archives/edgar/data/'
+
+
+# --- Synthetic fixtures ---
+
+def synthetic_png(width, height, seed=0):
+    """A valid RGB PNG filled with noise (so it doesn't compress), from the standard library only."""
+    rng = random.Random(seed)
+    raw = b''.join(b'\0' + rng.randbytes(width * 3) for _ in range(height))
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw, 1)) + chunk(b'IEND', b''))
+
+
+def synthetic_filing_html(form, period, target_bytes, images, seed=0):
+    """Inline-XBRL-like 10-K/10-Q body of about `target_bytes`, with Item headings, tables, hidden XBRL and `images` <img> tags."""
+    rng = random.Random(seed)
+    parts = ['<html><head><meta charset="utf-8"><title>', form, ' ', period, '</title>',
+             '<link rel="stylesheet" href="style.css"></head><body>',
+             '<div style="display:none"><ix:header><ix:hidden>', 'x' * 2000, '</ix:hidden></ix:header></div>',
+             f'<p>FORM {form} for the period {period}. The Companyâ€™s results â€” see Item 7.</p>']
+    size = sum(len(part) for part in parts); item = 0; table = 0
+    image_every = max(1, target_bytes // (images + 1)) if images else None
+    next_image = image_every; image = 0
+    while size < target_bytes:
+        if table % 8 == 0:
+            item += 1
+            block = f'<p><b>Item {item % 15 + 1}. Section {item}</b></p><p>{"Lorem ipsum dolor sit amet. " * 20}</p>'
+        else:
+            rows = ''.join(f'<tr><td style="padding:2px">Line item {r}</td><td>$ {rng.randint(1, 10 ** 7):,}</td><td>({rng.randint(1, 999)})</td></tr>'
+                           for r in range(20))
+            block = f'<table>{rows}</table>'
+        table += 1
+        parts.append(block); size += len(block)
+        if image_every and image < images and size >= next_image:
+            parts.append(f'<img src="img{image:03d}.png" alt="chart {image}">'); image += 1; next_image += image_every
+    parts.extend(f'<img src="img{i:03d}.png" alt="chart {i}">' for i in range(image, images))
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+
+def _period(form, filing_date):
+    return f"FY{filing_date.year % 100:02d}" if form == '10-K' else f"{(filing_date.month - 1) // 3 + 1}Q{filing_date.year % 100:02d}"
+
+
+def write_synthetic_fixtures(root, companies=1, filings=8, html_bytes=(200_000,), images=(4,), image_pixels=(400, 300), seed=0):
+    """
+    Writes a fixture tree under `root` and returns the CIKs (zero-padded strings).
+    Each company gets `filings` filings, newest first, cycling through one 10-K and three
+    10-Qs a year; filing i uses `html_bytes[i % len]` and `images[i % len]`, so a tuple
+    of sizes gives a mix.
+    """
+    width, height = image_pixels
+    ciks = []
+    for c in range(companies):
+        cik = f"{9000001 + c:010d}"; ciks.append(cik)
+        columns = {key: [] for key in ('accessionNumber', 'filingDate', 'reportDate', 'form', 'primaryDocument')}
+        filing_date = date(2025, 11, 1)
+        for i in range(filings):
+            form = '10-K' if i % 4 == 0 else '10-Q'
+            accession = f"{int(cik):010d}-{filing_date.year % 100:02d}-{i + 1:06d}"
+            doc = f"filing{i:03d}.htm"
+            folder = os.path.join(root, 'Archives', 'edgar', 'data', cik, accession.replace('-', ''))
+            os.makedirs(folder, exist_ok=True)
+            image_count = images[i % len(images)]
+            html = synthetic_filing_html(form, _period(form, filing_date), html_bytes[i % len(html_bytes)], image_count, seed=seed + i)
+            with open(os.path.join(folder, doc), 'w', encoding='utf-8') as f: f.write(html)
+            with open(os.path.join(folder, 'style.css'), 'w', encoding='utf-8') as f: f.write('body { font-family: serif; } td { padding: 1px; }')
+            for n in range(image_count):
+                with open(os.path.join(folder, f"img{n:03d}.png"), 'wb') as f: f.write(synthetic_png(width, height, seed=seed + i * 1000 + n))
+            columns['accessionNumber'].append(accession); columns['filingDate'].append(filing_date.isoformat())
+            columns['reportDate'].append((filing_date - timedelta(days=35)).isoformat()); columns['form'].append(form)
+            columns['primaryDocument'].append(doc)
+            filing_date -= timedelta(days=91)
+        submissions = {'cik': str(int(cik)), 'name': f"Synthetic Co {c + 1}", 'tickers': [f"SYN{c + 1}"], 'fiscalYearEnd': '1231',
+                       'filings': {'recent': columns, 'files': []}}
+        os.makedirs(os.path.join(root, 'submissions'), exist_ok=True)
+        with open(os.path.join(root, 'submissions', f"CIK{cik}.json"), 'w', encoding='utf-8') as f: json.dump(submissions, f)
+    return ciks
+
+
+# --- Server ---
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, so the client's connection pool is exercised
+
+    def do_GET(self):
+        stub = self.server.stub
+        path = unquote(urlparse(self.path).path)
+        stub._count('requests')
+        delay = stub.latency + (stub._random() * stub.jitter if stub.jitter else 0.0)
+        if delay: time.sleep(delay)
+        if stub.throttle_rate and stub._random() < stub.throttle_rate:
+            stub._count('throttled')
+            self._reply(429, b'Request Rate Threshold Exceeded', {'Retry-After': str(stub.retry_after), 'Content-Type': 'text/html'}); return
+        file_path = stub.resolve(path)
+        if file_path is None:
+            stub._count('not_found'); self._reply(404, b'Not Found', {'Content-Type': 'text/plain'}); return
+        with open(file_path, 'rb') as f: body = f.read()
+        headers = {'Content-Type': mimetypes.guess_type(file_path)[0] or 'application/octet-stream'}
+        if path.startswith(SUBMISSIONS_PREFIX):
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            headers['ETag'] = etag
+            if self.headers.get('If-None-Match') == etag:
+                stub._count('not_modified'); self._reply(304, b'', headers); return
+        stub._count('bytes', len(body))
+        self._reply(200, body, headers)
+
+    def _reply(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items(): self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body: self.wfile.write(body)
+
+    def log_message(self, format, *args): pass
+
+
+class EdgarStub:
+    """
+    Threaded HTTP server imitating data.sec.gov/submissions and www.sec.gov/Archives/edgar/data
+    from a fixture directory. Use as a context manager, or call `start()` / `stop()`.
+    `stats` counts requests, throttled (429), not_modified (304), not_found and bytes served.
+    """
+    def __init__(self, root, latency=0.0, jitter=0.0, throttle_rate=0.0, retry_after=1, seed=0, host='127.0.0.1', port=0):
+        self.root = os.path.abspath(root)
+        self.latency = latency; self.jitter = jitter
+        self.throttle_rate = throttle_rate; self.retry_after = retry_after
+        self.stats = dict(requests=0, throttled=0, not_modified=0, not_found=0, bytes=0)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environ(self):
+        """Environment variables that point sec_submissions and sec_pipeline at this server."""
+        return {'SEC_SUBMISSIONS_BASE_URL': self.base_url + SUBMISSIONS_PREFIX, 'SEC_ARCHIVES_BASE_URL': self.base_url + ARCHIVES_PREFIX}
+
+    def resolve(self, path):
+        """Fixture file for a request path, or None (unknown prefix, traversal, missing file)."""
+        if not (path.startswith(SUBMISSIONS_PREFIX) or path.startswith(ARCHIVES_PREFIX)): return None
+        parts = [part for part in path.split('/') if part]
+        if '..' in parts: return None
+        file_path = os.path.join(self.root, *parts)
+        return file_path if os.path.isfile(file_path) else None
+
+    def _random(self):
+        with self._lock: return self._rng.random()
+
+    def _count(self, name, amount=1):
+        with self._lock: self.stats[name] += amount
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="edgar_stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown(); self._server.server_close()
+
+    def __enter__(self): return self.start()
+    def __exit__(self, *exc): self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--root', help="Fixture directory (default: generate synthetic fixtures in a temp dir)")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of requests answered with 429")
+    args = parser.parse_args(argv)
+    root = args.root or tempfile.mkdtemp(prefix="edgar_stub_")
+    if not args.root: print(f"Synthetic fixtures for CIK(s) {', '.join(write_synthetic_fixtures(root))} in {root}")
+    stub = EdgarStub(root, args.latency_ms / 1000, args.jitter_ms / 1000, args.throttle_rate, port=args.port).start()
+    for name, value in stub.environ().items(): print(f"{name}={value}")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt: stub.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Disk-backed download bundles for a processing run.
+
+The ZIP is written straight to a file next to the run's PDFs, one member at a
+time, so at most one read buffer is held in memory. PDFs are already
+compressed, so members are STORED rather than deflated. Individual downloads
+are handed to Streamlit as deferred callables that read the file only when
+the user actually clicks.
+"""
+import os
+import zipfile
+
+
+def build_zip_archive(pdf_paths, zip_path):
+    """
+    Writes `pdf_paths` into a ZIP at `zip_path` (members named by base name) and returns
+    `zip_path`. The archive is written to a temporary name and renamed when complete, so a
+    half-written ZIP is never served. Missing files are skipped.
+    """
+    part_path = zip_path + '.part'
+    try:
+        with zipfile.ZipFile(part_path, 'w', zipfile.ZIP_STORED, allowZip64=True) as zip_file:
+            for pdf_path in pdf_paths:
+                if pdf_path and os.path.exists(pdf_path):
+                    zip_file.write(pdf_path, arcname=os.path.basename(pdf_path)) # Streams the file in chunks
+        os.replace(part_path, zip_path)
+    finally:
+        if os.path.exists(part_path): os.remove(part_path)
+    return zip_path
+
+
+def get_or_build_zip(pdf_paths, zip_path):
+    """Returns (zip_path, created). Reuses an existing archive so reruns don't rebuild it."""
+    if os.path.exists(zip_path): return zip_path, False
+    return build_zip_archive(pdf_paths, zip_path), True
+
+
+def deferred_file(path):
+    """Returns a no-argument callable that reads `path` when called (for download buttons). The file is closed before it returns."""
+    def _read():
+        with open(path, 'rb') as f: return f.read()
+    return _read
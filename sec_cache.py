@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache for EDGAR archive documents.
+
+Anything under /Archives/edgar/data/{cik}/{accession}/ is immutable once
+published, so it can be cached forever (subject to the size cap). Entries are
+keyed by "{cik}/{accession}/{document path}" and point at content-addressed
+blobs (sha256), so a logo or stylesheet shared by many filings is stored once.
+The index lives in SQLite next to the blobs; when the total blob size exceeds
+`max_bytes`, least-recently-used entries are evicted and unreferenced blobs
+deleted.
+
+Rendered PDFs share the same store under "pdf/{fingerprint}" keys (see
+`PdfResultCache`), so one size cap covers both.
+"""
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import warnings
+from urllib.parse import urlparse
+
+DEFAULT_CACHE_DIR = os.environ.get('SEC_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'sec_viewer_cache'))
+DEFAULT_CACHE_MAX_BYTES = int(os.environ.get('SEC_CACHE_MAX_BYTES', 2 * 1024 ** 3)) # 2 GiB
+EVICT_TARGET_RATIO = 0.9 # Evict down to 90% of the cap so we don't evict on every put
+
+_ARCHIVE_PATH_RE = re.compile(r'^/Archives/edgar/data/(\d+)/(\d{18})/(.+)$')
+
+
+def archive_key(url):
+    """
+    Returns the cache key for an immutable EDGAR archive URL, or None if `url` is not one.
+    The CIK is normalised (no zero padding) since EDGAR serves both forms.
+    """
+    parsed = urlparse(url)
+    if parsed.query: return None
+    match = _ARCHIVE_PATH_RE.match(parsed.path)
+    if not match: return None
+    cik, accession, doc_path = match.groups()
+    if '..' in doc_path.split('/'): return None
+    return f"{int(cik)}/{accession}/{doc_path}"
+
+
+class FilingCache:
+    """Content-addressed blob store with an LRU-evicted key index. Safe to share between threads."""
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(root, 'blobs')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, 'index.sqlite3'), timeout=30, check_same_thread=False)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER NOT NULL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, digest TEXT NOT NULL, "
+                             "content_type TEXT, last_access REAL NOT NULL, render_seconds REAL)")
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(entries)")}
+            if 'render_seconds' not in columns: # Index from before rendered PDFs recorded their render time
+                self._db.execute("ALTER TABLE entries ADD COLUMN render_seconds REAL")
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)")
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def get(self, key):
+        """Returns (blob_path, content_type) for `key`, or None on a miss. Marks the entry as recently used."""
+        if key is None: return None
+        with self._lock:
+            row = self._db.execute("SELECT digest, content_type FROM entries WHERE key = ?", (key,)).fetchone()
+            if not row: return None
+            path = self._blob_path(row[0])
+            if not os.path.exists(path): # Blob removed behind our back: forget the entry
+                with self._db: self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            with self._db: self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            return path, row[1]
+
+    def render_seconds(self, key):
+        """Render time stored with `key` (see `put_file`), or None if unknown."""
+        with self._lock:
+            row = self._db.execute("SELECT render_seconds FROM entries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def get_bytes(self, key):
+        """Returns (content bytes, content_type) for `key`, or None on a miss."""
+        hit = self.get(key)
+        if not hit: return None
+        try:
+            with open(hit[0], 'rb') as f: return f.read(), hit[1]
+        except OSError: return None
+
+    def put(self, key, data, content_type=None):
+        """Stores `data` under `key`. Returns the blob path."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir, prefix='.incoming_')
+        with os.fdopen(fd, 'wb') as f: f.write(data)
+        return self._commit(key, tmp_path, hashlib.sha256(data).hexdigest(), len(data), content_type)
+
+    def put_file(self, key, src_path, content_type=None, render_seconds=None):
+        """
+        Stores a copy of the file at `src_path` under `key`. Returns the blob path.
+        `render_seconds` records how long a rendered file took to produce (see `PdfResultCache`).
+        """
+        digest = hashlib.sha256(); size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir, prefix='.incoming_')
+        try:
+            with os.fdopen(fd, 'wb') as dst, open(src_path, 'rb') as src:
+                for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                    dst.write(chunk); digest.update(chunk); size += len(chunk)
+        except BaseException:
+            os.remove(tmp_path); raise
+        return self._commit(key, tmp_path, digest.hexdigest(), size, content_type, render_seconds)
+
+    def _commit(self, key, tmp_path, digest, size, content_type, render_seconds=None):
+        blob_path = self._blob_path(digest)
+        with self._lock:
+            if os.path.exists(blob_path): os.remove(tmp_path) # Same content already stored (shared asset)
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(tmp_path, blob_path)
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO blobs (digest, size) VALUES (?, ?)", (digest, size))
+                if key is not None:
+                    self._db.execute("INSERT OR REPLACE INTO entries (key, digest, content_type, last_access, render_seconds) VALUES (?, ?, ?, ?, ?)",
+                                     (key, digest, content_type, time.time(), render_seconds))
+            self._evict_locked()
+        return blob_path
+
+    def total_bytes(self):
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def _evict_locked(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes: return
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        lru = self._db.execute("SELECT key, digest FROM entries ORDER BY last_access").fetchall()
+        with self._db:
+            for key, digest in lru:
+                if total <= target: break
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                if self._db.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone(): continue # Still shared
+                size = self._db.execute("SELECT size FROM blobs WHERE digest = ?", (digest,)).fetchone()
+                self._db.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                try: os.remove(self._blob_path(digest))
+                except OSError: pass
+                total -= size[0] if size else 0
+
+
+class PdfResultCache:
+    """
+    Rendered PDFs keyed by `sec_render.render_fingerprint`. Any change to the HTML, assets,
+    stylesheet or WeasyPrint version changes the fingerprint, so stale entries are never
+    served (they simply age out of the LRU). Each entry remembers how long it took to render
+    (the index's `render_seconds` column), so a hit knows the time it saved.
+    Keeps hit/miss counters for this process.
+    """
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self.hits = 0; self.misses = 0
+        self.render_seconds = 0.0 # Total time spent rendering misses
+        self.saved_seconds = 0.0 # Total render time of the entries served
+
+    def fetch(self, fingerprint, dest_path):
+        """
+        Copies the cached PDF for `fingerprint` to `dest_path`. Returns the render time the hit
+        saved (seconds; this process's average for entries stored without one), or None on a miss.
+        """
+        hit = self.store.get(f"pdf/{fingerprint}") if fingerprint else None
+        if hit:
+            try: shutil.copyfile(hit[0], dest_path)
+            except OSError: hit = None
+        if not hit:
+            with self._lock: self.misses += 1
+            return None
+        saved = self.store.render_seconds(f"pdf/{fingerprint}")
+        with self._lock:
+            if saved is None: saved = self.render_seconds / self.misses if self.misses else 0.0
+            self.hits += 1; self.saved_seconds += saved
+            return saved
+
+    def store_pdf(self, fingerprint, pdf_path, render_seconds):
+        """Stores a freshly rendered PDF along with how long it took to render."""
+        with self._lock: self.render_seconds += render_seconds
+        if fingerprint: self.store.put_file(f"pdf/{fingerprint}", pdf_path, 'application/pdf', render_seconds=render_seconds)
+
+    def stats(self):
+        """Hit/miss counts, time spent rendering misses and render time saved by hits (this process)."""
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, render_seconds=self.render_seconds, saved_seconds=self.saved_seconds)
+
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_filing_cache():
+    """Returns the process-wide FilingCache, or None if the cache directory can't be used."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try: _cache = FilingCache()
+            except (OSError, sqlite3.Error) as e:
+                warnings.warn(f"Filing cache disabled: {e}", RuntimeWarning, stacklevel=2); return None
+        return _cache
+
+_pdf_cache = None
+
+def get_pdf_cache():
+    """Returns the process-wide PdfResultCache (backed by the filing cache), or None if unavailable."""
+    global _pdf_cache
+    store = get_filing_cache()
+    if store is None: return None
+    with _cache_lock:
+        if _pdf_cache is None: _pdf_cache = PdfResultCache(store)
+        return _pdf_cache
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Command-line entry point for the SEC filing pipeline (no Streamlit needed).
+
+    python sec_cli.py plan ciks.txt
+    python sec_cli.py run ciks.txt --out ./pdfs --workers 4
+
+The CIK file has one company per line: CIK[,TICKER[,FY_END_MONTH[,FY_BASIS]]]
+where FY_BASIS is "same" (default) or "previous". Blank lines and lines
+starting with '#' are ignored, e.g.
+
+    # cik, ticker, fiscal year-end month, fiscal year basis
+    1049502, MRNA
+    320193, AAPL, 9
+    1018724
+
+`plan` lists the filings a run would process without downloading them;
+`run` downloads, renders and moves the PDFs to OUT/<TICKER or CIK>/.
+Both take --since/--until (filing dates) and --min-fy (fiscal-year cutoff,
+default 2017); older history pages are only fetched when the range needs them.
+With `run --incremental`, OUT keeps a manifest of processed accessions and
+only filings that are new since the last run are downloaded and rendered.
+`run --metrics FILE` appends per-filing and per-run stage timings as JSON
+lines, `--metrics-port` serves them in Prometheus format while the run lasts
+and `--profile ACCESSION` writes a cProfile dump of that filing to OUT.
+"""
+import argparse
+import os
+import shutil
+import sys
+from datetime import date
+
+LEVELS = ("info", "success", "warning", "error") # "heading" is always shown
+FY_BASIS = {"same": "Same Year", "previous": "Previous Year"}
+
+
+def read_cik_file(path):
+    """Parses the CIK file. Returns a list of dicts (cik, ticker, fy_month, fy_adjust)."""
+    companies = []
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line: continue
+            fields = [field.strip() for field in line.split(',')]
+            cik = fields[0]
+            if not cik.isdigit(): raise ValueError(f"{path}:{line_no}: CIK must be a number, got '{cik}'")
+            ticker = fields[1].upper() if len(fields) > 1 else ''
+            try: fy_month = int(fields[2]) if len(fields) > 2 and fields[2] else 12
+            except ValueError: raise ValueError(f"{path}:{line_no}: fiscal year-end month must be 1-12, got '{fields[2]}'")
+            if not 1 <= fy_month <= 12: raise ValueError(f"{path}:{line_no}: fiscal year-end month must be 1-12, got {fy_month}")
+            basis = fields[3].lower() if len(fields) > 3 and fields[3] else 'same'
+            if basis not in FY_BASIS: raise ValueError(f"{path}:{line_no}: fiscal year basis must be 'same' or 'previous', got '{basis}'")
+            companies.append(dict(cik=cik, ticker=ticker, fy_month=fy_month, fy_adjust=FY_BASIS[basis]))
+    return companies
+
+
+def make_progress(min_level):
+    """Console progress callback that hides messages below `min_level`."""
+    threshold = LEVELS.index(min_level)
+    def progress(message, level="info", exc=None):
+        if level == "heading": print(f"== {message}", flush=True)
+        elif LEVELS.index(level) >= threshold: print(f"[{level}] {message}", flush=True, file=sys.stderr if level == "error" else sys.stdout)
+        if exc is not None and threshold <= LEVELS.index("error"):
+            import traceback
+            traceback.print_exception(type(exc), exc, exc.__traceback__)
+    return progress
+
+
+def selection_options(args):
+    """Filing selection keyword arguments for the pipeline functions."""
+    return dict(min_fiscal_year=args.min_fy or None, start_date=args.since, end_date=args.until)
+
+
+def cmd_plan(args):
+    from itertools import islice
+    import requests
+    from sec_pipeline import fetch_submissions, prepare_filing_jobs
+    progress = make_progress(args.log_level)
+    for company in read_cik_file(args.cik_file):
+        cik_padded = company['cik'].zfill(10)
+        try: data = fetch_submissions(cik_padded, progress)
+        except requests.exceptions.RequestException as e:
+            progress(f"Network error fetching submission data for CIK {cik_padded}: {e}", level="error"); continue
+        prepared = prepare_filing_jobs(data, cik_padded, company['ticker'], company['fy_month'], company['fy_adjust'], True, progress=progress,
+                                       **selection_options(args))
+        if prepared is None: continue
+        company_name, ticker, jobs = prepared
+        progress(f"{company_name} ({ticker or cik_padded})", level="heading")
+        for job in islice(jobs, args.max_filings):
+            print(f"  {job['form']:5} {job['date_str']}  {job['period']:6} {job['accession']}  {job['doc_url']}")
+    return 0
+
+
+def cmd_run(args):
+    from sec_metrics import RunMetrics, format_summary, serve_metrics
+    progress = make_progress(args.log_level)
+    slim = dict(sections=args.sections, max_image_pixels=args.max_image_pixels or None) if args.slim or args.sections else None
+    if args.metrics_port: serve_metrics(args.metrics_port); progress(f"Serving metrics at http://127.0.0.1:{args.metrics_port}/metrics", level="info")
+    failed = []
+    manifest = None
+    if args.incremental:
+        from sec_manifest import get_manifest
+        manifest = get_manifest(args.out)
+    for company in read_cik_file(args.cik_file):
+        metrics = RunMetrics(company['cik'], profile_accession=args.profile, profile_dir=args.out)
+        try: failed += run_company(args, company, manifest, slim, metrics, progress)
+        finally:
+            progress(f"Metrics: {format_summary(metrics.summary())}", level="info")
+            if args.metrics: metrics.write_json_lines(args.metrics)
+    if failed: progress(f"No PDFs generated for CIK(s): {', '.join(failed)}", level="error")
+    return 1 if failed else 0
+
+
+def run_company(args, company, manifest, slim, metrics, progress):
+    """Processes one company for `cmd_run`. Returns [cik] if no PDFs were produced, else []."""
+    from sec_pipeline import process_filings_for_cik, sync_filings_for_cik
+    if manifest is not None:
+        dest_dir = os.path.join(args.out, company['ticker'] or company['cik'].zfill(10))
+        pdf_paths, _ = sync_filings_for_cik(
+            company['cik'], company['ticker'], company['fy_month'], company['fy_adjust'], not args.keep_temp, dest_dir, manifest,
+            max_workers=args.workers, streaming_ingest=True if args.low_memory else None,
+            slim=slim, progress=progress, max_filings=args.max_filings, metrics=metrics, **selection_options(args))
+        return [] if pdf_paths else [company['cik']]
+    pdf_paths, pdf_dir = process_filings_for_cik(
+        company['cik'], company['ticker'], company['fy_month'], company['fy_adjust'], not args.keep_temp,
+        max_workers=args.workers, streaming_ingest=True if args.low_memory else None,
+        slim=slim, progress=progress, max_filings=args.max_filings, metrics=metrics, **selection_options(args))
+    if not pdf_paths: return [company['cik']]
+    dest_dir = os.path.join(args.out, company['ticker'] or company['cik'].zfill(10))
+    os.makedirs(dest_dir, exist_ok=True)
+    with metrics.stage('move'):
+        for pdf_path in pdf_paths: shutil.move(pdf_path, os.path.join(dest_dir, os.path.basename(pdf_path)))
+    shutil.rmtree(pdf_dir, ignore_errors=True)
+    progress(f"{len(pdf_paths)} PDF(s) written to {dest_dir}", level="success")
+    return []
+
+
+def build_parser():
+    from sec_slim import DEFAULT_MAX_IMAGE_PIXELS # Stdlib-only module, cheap to import
+    parser = argparse.ArgumentParser(prog="sec_cli.py", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("cik_file", help="File with one CIK[,TICKER[,FY_END_MONTH[,FY_BASIS]]] per line")
+    common.add_argument("--max-filings", type=int, default=20, help="PDFs per company (default: 20)")
+    common.add_argument("--log-level", choices=LEVELS, default="info", help="Hide messages below this level")
+    common.add_argument("--since", type=date.fromisoformat, metavar="YYYY-MM-DD", help="Only filings filed on or after this date")
+    common.add_argument("--until", type=date.fromisoformat, metavar="YYYY-MM-DD", help="Only filings filed on or before this date")
+    common.add_argument("--min-fy", type=int, default=2017, metavar="YEAR", help="Skip filings before this fiscal year (default: 2017, 0 = no cutoff)")
+    plan = sub.add_parser("plan", parents=[common], help="List the filings a run would process")
+    plan.set_defaults(func=cmd_plan)
+    run = sub.add_parser("run", parents=[common], help="Download filings and render PDFs")
+    run.add_argument("--out", required=True, help="Output directory (one sub-folder per company)")
+    run.add_argument("--workers", type=int, default=4, help="Filings processed concurrently (default: 4, 1 = sequential)")
+    run.add_argument("--low-memory", action="store_true", help="Use streaming ingest for every filing")
+    run.add_argument("--incremental", action="store_true", help="Only process filings not already recorded in OUT's manifest")
+    run.add_argument("--keep-temp", action="store_true", help="Keep intermediate HTML/asset files")
+    run.add_argument("--slim", action="store_true", help="Drop hidden inline-XBRL content and downsample large images before rendering")
+    run.add_argument("--sections", type=lambda value: [item.strip().upper() for item in value.split(',') if item.strip()], metavar="ITEMS",
+                     help="Only render these Items, e.g. 1A,7,8 (implies --slim)")
+    run.add_argument("--max-image-pixels", type=int, default=DEFAULT_MAX_IMAGE_PIXELS, metavar="N",
+                     help=f"With --slim, downsample images above N pixels (default: {DEFAULT_MAX_IMAGE_PIXELS}, 0 = keep)")
+    run.add_argument("--metrics", metavar="FILE", help="Append per-filing and per-run metrics to FILE as JSON lines")
+    run.add_argument("--metrics-port", type=int, metavar="PORT", help="Serve Prometheus metrics on 127.0.0.1:PORT during the run")
+    run.add_argument("--profile", metavar="ACCESSION", help="Profile this filing with cProfile (writes OUT/ACCESSION.prof)")
+    run.set_defaults(func=cmd_run)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try: return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr); return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP helpers shared by every request made to SEC EDGAR.
+
+EDGAR's fair-access policy allows at most 10 requests per second per client.
+All fetches (submissions JSON, filing HTML, assets) go through `sec_get` so they
+draw from one process-wide rate governor, no matter how many worker threads or
+Streamlit sessions are running. Set SEC_RATE_STATE_FILE to a path to share the
+governor between processes too (CLI runs, app replicas on one host): its state
+then lives in that file, guarded by an OS file lock.
+
+The governor adapts to throttling (AIMD): a 429/503 halves the request rate
+and pauses everyone for the `Retry-After` period, and each successful response
+adds back a little rate up to the ceiling. `sec_get` retries GETs that fail
+with a connection error or a retryable status, with jittered exponential backoff.
+
+Requests share one connection-pooled client (`get_http_client`), so keep-alive
+connections to data.sec.gov and www.sec.gov are reused across filings and
+threads. If httpx and h2 are installed it is an HTTP/2 client (set SEC_HTTP2=0
+to opt out), otherwise a `requests.Session`; either way callers get
+requests-style responses and exceptions. `host_slot(url)` caps concurrent
+downloads per host (SEC_MAX_CONNECTIONS_PER_HOST).
+"""
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+# Stay a little under the 10 req/s ceiling to leave headroom for clock jitter.
+SEC_MAX_REQUESTS_PER_SECOND = 8
+SEC_MIN_REQUESTS_PER_SECOND = 1 # Floor for the adaptive rate
+# Bucket capacity, independent of the rate: at most burst + rate requests fit in any one-second window
+RATE_BURST_TOKENS = 1
+RATE_INCREASE_PER_RESPONSE = 0.1 # Additive increase (req/s) per successful response
+RATE_DECREASE_FACTOR = 0.5 # Multiplicative decrease on 429/503
+RATE_STATE_FILE = os.environ.get('SEC_RATE_STATE_FILE') # Shared state for multi-process deployments
+
+DEFAULT_RETRIES = 4 # Extra attempts for a failed GET
+RETRY_BACKOFF_BASE = 1.0 # Seconds; attempt n waits up to base * 2**n (full jitter)
+RETRY_BACKOFF_MAX = 60.0
+MAX_RETRY_AFTER = 300.0 # Longest Retry-After honoured, in seconds
+THROTTLE_STATUSES = (429, 503)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+MAX_CONNECTIONS_PER_HOST = int(os.environ.get('SEC_MAX_CONNECTIONS_PER_HOST', 6))
+HTTP2_ENABLED = os.environ.get('SEC_HTTP2', '1') != '0' # Used only if httpx and h2 are installed
+
+
+class _LocalState:
+    """Governor state for one process: a dict guarded by a thread lock."""
+    def __init__(self):
+        self._state = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self):
+        with self._lock: yield self._state
+
+
+class _FileState:
+    """Governor state kept as JSON in `path` and updated under an exclusive OS file lock."""
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    @contextmanager
+    def transaction(self):
+        with open(self.path, 'a+b') as f:
+            if fcntl: fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else: f.seek(0); msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                f.seek(0)
+                try: state = json.loads(f.read() or b'{}')
+                except ValueError: state = {} # Torn/corrupt file: start over
+                yield state
+                f.seek(0); f.truncate(); f.write(json.dumps(state).encode()); f.flush()
+            finally:
+                if fcntl: fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else: f.seek(0); msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class RateGovernor:
+    """
+    Token bucket whose rate adapts to throttling (additive increase, multiplicative decrease).
+    The bucket holds at most `burst` tokens and starts with that many, so a cold start or an
+    idle spell can't release a burst. `acquire()` blocks until a request may be sent. Report outcomes with `succeeded()` and
+    `throttled(retry_after)`. With `state_file`, every process using that file shares one budget.
+    """
+    def __init__(self, max_rate, min_rate=SEC_MIN_REQUESTS_PER_SECOND, increase=RATE_INCREASE_PER_RESPONSE,
+                 decrease=RATE_DECREASE_FACTOR, state_file=None, burst=RATE_BURST_TOKENS):
+        if max_rate <= 0 or min_rate <= 0:
+            raise ValueError("rates must be positive")
+        if burst < 1:
+            raise ValueError("burst must be at least one token")
+        self.max_rate = float(max_rate)
+        self.min_rate = float(min(min_rate, max_rate))
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = float(burst)
+        self._store = _FileState(state_file) if state_file else _LocalState()
+        self._stats_lock = threading.Lock()
+        self.throttle_events = 0; self.retries = 0 # This process only
+
+    def _refill(self, state, now):
+        """Fills in defaults and adds the tokens earned since the last update (wall clock, so it works across processes)."""
+        rate = state.setdefault('rate', self.max_rate)
+        state.setdefault('tokens', self.burst); state.setdefault('paused_until', 0.0); state.setdefault('last_decrease', 0.0)
+        elapsed = now - state.setdefault('last', now)
+        if elapsed > 0:
+            state['tokens'] += elapsed * rate
+            state['last'] = now
+        state['tokens'] = min(self.burst, state['tokens']) # Also trims state files written with a larger capacity
+        return rate
+
+    @property
+    def rate(self):
+        """Current allowed requests per second."""
+        with self._store.transaction() as state: return self._refill(state, time.time())
+
+    def acquire(self):
+        """Blocks until a request may be sent."""
+        while True:
+            with self._store.transaction() as state:
+                now = time.time()
+                rate = self._refill(state, now)
+                if now < state['paused_until']: wait = state['paused_until'] - now
+                elif state['tokens'] >= 1:
+                    state['tokens'] -= 1
+                    return
+                else: wait = (1 - state['tokens']) / rate
+            time.sleep(wait)
+
+    def succeeded(self):
+        """Additive increase after a response that was not throttled."""
+        with self._store.transaction() as state:
+            rate = self._refill(state, time.time())
+            if rate < self.max_rate: state['rate'] = min(self.max_rate, rate + self.increase)
+
+    def retried(self):
+        """Counts a retried request (for stats)."""
+        with self._stats_lock: self.retries += 1
+
+    def throttled(self, retry_after=None):
+        """
+        Multiplicative decrease after a 429/503, at most once per second so that a burst of
+        rejected in-flight requests counts as one event. All callers pause for `retry_after` seconds.
+        """
+        with self._stats_lock: self.throttle_events += 1
+        with self._store.transaction() as state:
+            now = time.time()
+            rate = self._refill(state, now)
+            if now - state['last_decrease'] >= 1.0:
+                state['rate'] = max(self.min_rate, rate * self.decrease)
+                state['last_decrease'] = now
+            state['tokens'] = 0.0
+            if retry_after: state['paused_until'] = max(state['paused_until'], now + min(retry_after, MAX_RETRY_AFTER))
+
+
+# One governor for the whole process (module import is cached, so every caller shares it)
+SEC_RATE_LIMITER = RateGovernor(SEC_MAX_REQUESTS_PER_SECOND, state_file=RATE_STATE_FILE)
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a `Retry-After` header (delta-seconds or HTTP-date), or None."""
+    if not value: return None
+    try: return max(0.0, float(value))
+    except ValueError: pass
+    try: return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError): return None
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for retry number `attempt` (0-based)."""
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** attempt))
+
+
+class _HttpxResponse:
+    """requests-style view of a (possibly streamed) httpx response."""
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.reason = response.reason_phrase
+
+    @property
+    def content(self):
+        try: return self._response.read()
+        except Exception as e: raise _requests_error(e) from e
+        finally: self._response.close()
+
+    def iter_content(self, chunk_size=None):
+        try: yield from self._response.iter_bytes(chunk_size)
+        except Exception as e: raise _requests_error(e) from e
+        finally: self._response.close()
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            self.close()
+            raise requests.exceptions.HTTPError(f"{self.status_code} {self.reason} for url: {self.url}", response=self)
+
+    def close(self):
+        self._response.close()
+
+
+def _requests_error(e):
+    """Maps an httpx exception to the requests exception the pipeline handles."""
+    import httpx
+    if isinstance(e, httpx.TimeoutException): return requests.exceptions.Timeout(str(e))
+    if isinstance(e, httpx.TransportError): return requests.exceptions.ConnectionError(str(e))
+    if isinstance(e, httpx.HTTPError): return requests.exceptions.RequestException(str(e))
+    return e
+
+
+class _HttpxClient:
+    """HTTP/2 client with the `get(url, headers=, timeout=, stream=)` subset of `requests.Session`."""
+    def __init__(self):
+        import httpx
+        limits = httpx.Limits(max_connections=MAX_CONNECTIONS_PER_HOST * 2, max_keepalive_connections=MAX_CONNECTIONS_PER_HOST * 2)
+        self._client = httpx.Client(http2=True, limits=limits, follow_redirects=True)
+
+    def get(self, url, headers=None, timeout=None, stream=False, **kwargs):
+        try:
+            request = self._client.build_request('GET', url, headers=headers, timeout=timeout, **kwargs)
+            return _HttpxResponse(self._client.send(request, stream=stream))
+        except Exception as e: raise _requests_error(e) from e
+
+    def close(self):
+        self._client.close()
+
+
+def _make_http_client():
+    if HTTP2_ENABLED:
+        try: return _HttpxClient()
+        except ImportError: pass # httpx or h2 not installed
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONNECTIONS_PER_HOST)
+    session.mount('https://', adapter); session.mount('http://', adapter)
+    return session
+
+
+_client = None
+_client_lock = threading.Lock()
+_host_slots = {}
+
+def get_http_client():
+    """Returns the process-wide pooled HTTP client (created on first use)."""
+    global _client
+    with _client_lock:
+        if _client is None: _client = _make_http_client()
+        return _client
+
+
+def host_slot(url):
+    """Semaphore to hold while downloading from `url`'s host; at most MAX_CONNECTIONS_PER_HOST are held per host."""
+    host = urlparse(url).netloc.lower()
+    with _client_lock:
+        if host not in _host_slots: _host_slots[host] = threading.BoundedSemaphore(MAX_CONNECTIONS_PER_HOST)
+        return _host_slots[host]
+
+
+def sec_get(url, retries=DEFAULT_RETRIES, **kwargs):
+    """
+    GET through the pooled client (`requests.get` arguments), paced by the shared SEC rate
+    governor. Connection errors, timeouts and 429/5xx responses are retried up to `retries`
+    times with jittered backoff; 429/503 also slow the governor down and honour `Retry-After`.
+    Only responses that won't be retried count as successes for the governor's rate increase.
+    The last response (or exception) is returned (or raised) as is.
+    """
+    for attempt in range(retries + 1):
+        SEC_RATE_LIMITER.acquire()
+        try: response = get_http_client().get(url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == retries: raise
+        else:
+            if response.status_code in THROTTLE_STATUSES:
+                SEC_RATE_LIMITER.throttled(parse_retry_after(response.headers.get('Retry-After')))
+            elif response.status_code not in RETRY_STATUSES: SEC_RATE_LIMITER.succeeded() # Other 5xx are neutral: don't speed up while the server fails
+            if response.status_code not in RETRY_STATUSES or attempt == retries: return response
+            response.close()
+        SEC_RATE_LIMITER.retried()
+        time.sleep(backoff_delay(attempt))
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Low-memory streaming ingest for very large (inline-XBRL) filings.
+
+The regular path in `download_and_process` keeps the raw bytes, the decoded
+text, a BeautifulSoup tree and its serialisation in memory at once. For
+50-150 MB filings that is several times the document size. Here the body is
+streamed to disk and then read twice in fixed-size chunks:
+
+1. scan: pick the charset (UTF-8 if the whole file decodes, else ISO-8859-1,
+   matching the regular path), collect asset references and note whether the
+   document already declares `<meta charset>`.
+2. write: decode, repair mojibake, point downloaded assets at their local copies
+   and force `<meta charset="UTF-8">`, all in one pass over the chunks.
+
+No document tree is built, so peak memory is bounded by the chunk size plus
+the largest single tag, not by the filing size.
+"""
+import codecs
+import html
+import re
+
+STREAM_CHUNK_SIZE = 1024 * 1024 # 1 MiB
+STREAMING_INGEST_THRESHOLD_BYTES = 25 * 1024 * 1024 # Filings larger than this use the streaming path
+
+# Common UTF-8-read-as-cp1252 sequences and their intended characters. Longer
+# sequences must win over their prefixes, so the regex is built longest-first.
+MOJIBAKE_REPLACEMENTS = { "â€œ": "\"", "â€™": "'", "â€˜": "'", "â€“": "-", "â€”": "-", "â€": "\"" }
+_MOJIBAKE_RE = re.compile('|'.join(re.escape(k) for k in sorted(MOJIBAKE_REPLACEMENTS, key=len, reverse=True)))
+# Characters that can start or continue (but not end) a sequence: a chunk must not be cut right after one
+_MOJIBAKE_PREFIX_CHARS = frozenset(c for k in MOJIBAKE_REPLACEMENTS for c in k[:-1])
+
+_TAG_RE = re.compile(r'''<(img|script|link|meta|head)\b(?:[^>"']|"[^"]*"|'[^']*')*>''', re.IGNORECASE)
+_ATTR_RE = re.compile(r'''([^\s"'<>/=]+)\s*=\s*("[^"]*"|'[^']*'|[^\s"'>]+)''')
+META_CHARSET_TAG = '<meta charset="UTF-8">'
+
+
+def fix_mojibake(text):
+    """Replaces all known mojibake sequences in a single regex pass."""
+    return _MOJIBAKE_RE.sub(lambda m: MOJIBAKE_REPLACEMENTS[m.group(0)], text)
+
+
+def stream_response_to_file(response, path, chunk_size=STREAM_CHUNK_SIZE):
+    """Writes a `stream=True` response body to `path` chunk by chunk. Returns the number of bytes written."""
+    written = 0
+    with open(path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if chunk: f.write(chunk); written += len(chunk)
+    return written
+
+
+def _iter_text(path, encoding, chunk_size=STREAM_CHUNK_SIZE):
+    """Decodes the file at `path` incrementally (multi-byte characters may span chunks)."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='strict')
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            text = decoder.decode(chunk)
+            if text: yield text
+    tail = decoder.decode(b'', final=True)
+    if tail: yield tail
+
+
+def _iter_segments(text_chunks):
+    """
+    Re-cuts decoded chunks so no segment ends inside a tag or inside a mojibake sequence.
+    Each yielded segment can be transformed on its own.
+    """
+    carry = ''
+    for text in text_chunks:
+        buf = carry + text
+        cut = len(buf)
+        lt = buf.rfind('<')
+        if lt != -1 and buf.find('>', lt) == -1: cut = lt # Unfinished tag: keep it for the next chunk
+        while cut > 0 and buf[cut - 1] in _MOJIBAKE_PREFIX_CHARS: cut -= 1
+        if cut: yield buf[:cut]
+        carry = buf[cut:]
+    if carry: yield carry
+
+
+def _attrs(tag_text):
+    """Yields (lowercased name, raw value without quotes, value start, value end) for each attribute."""
+    for m in _ATTR_RE.finditer(tag_text):
+        raw = m.group(2); start, end = m.span(2)
+        if raw[:1] in ('"', "'"): raw = raw[1:-1]; start += 1; end -= 1
+        yield m.group(1).lower(), raw, start, end
+
+
+def _asset_attr(tag_name, tag_text):
+    """Returns (raw value, start, end) of the asset URL attribute, using the same rules as `download_assets`."""
+    attrs = {name: (raw, start, end) for name, raw, start, end in _attrs(tag_text)}
+    if tag_name in ('img', 'script'): found = attrs.get('src')
+    elif tag_name == 'link' and html.unescape(attrs.get('rel', ('',))[0]).strip().lower() == 'stylesheet': found = attrs.get('href')
+    else: found = None
+    if not found or not found[0] or html.unescape(found[0]).startswith('data:'): return None
+    return found
+
+
+def scan_filing(path):
+    """
+    First pass. Returns (encoding, asset URLs in document order without duplicates, has_meta_charset, has_head).
+    Asset URLs are HTML-unescaped, i.e. ready to resolve against the document URL.
+    """
+    for encoding in ('utf-8', 'iso-8859-1'): # ISO-8859-1 decodes any byte sequence
+        asset_urls = {}; has_meta_charset = has_head = False
+        try:
+            for segment in _iter_segments(_iter_text(path, encoding)):
+                for m in _TAG_RE.finditer(segment):
+                    tag_name = m.group(1).lower(); tag_text = m.group(0)
+                    if tag_name == 'head': has_head = True
+                    elif tag_name == 'meta':
+                        if any(name == 'charset' for name, _, _, _ in _attrs(tag_text)): has_meta_charset = True
+                    else:
+                        found = _asset_attr(tag_name, tag_text)
+                        if found: asset_urls.setdefault(html.unescape(found[0]), None)
+            return encoding, list(asset_urls), has_meta_charset, has_head
+        except UnicodeDecodeError: continue
+    raise AssertionError("unreachable: iso-8859-1 accepts all input")
+
+
+def write_filing(path, out_path, encoding, local_names, has_meta_charset, has_head):
+    """
+    Second pass. Decodes `path`, fixes mojibake, rewrites asset URLs found in `local_names`
+    (unescaped URL -> local file name) and writes UTF-8 to `out_path`. Returns bytes written.
+    """
+    inserted_meta = has_meta_charset
+    def rewrite_tag(m):
+        nonlocal inserted_meta
+        tag_name = m.group(1).lower(); tag_text = m.group(0)
+        if tag_name == 'head':
+            if inserted_meta: return tag_text
+            inserted_meta = True
+            return tag_text + META_CHARSET_TAG
+        if tag_name == 'meta':
+            for name, raw, start, end in _attrs(tag_text):
+                if name == 'charset' and raw.lower() != 'utf-8': return tag_text[:start] + 'UTF-8' + tag_text[end:]
+            return tag_text
+        found = _asset_attr(tag_name, tag_text)
+        if found:
+            local_name = local_names.get(html.unescape(found[0]))
+            if local_name: return tag_text[:found[1]] + html.escape(local_name) + tag_text[found[2]:]
+        return tag_text
+
+    written = 0
+    with open(out_path, 'w', encoding='utf-8') as out:
+        if not has_meta_charset and not has_head:
+            out.write(f"<head>{META_CHARSET_TAG}</head>"); inserted_meta = True
+        for segment in _iter_segments(_iter_text(path, encoding)):
+            written += out.write(_TAG_RE.sub(rewrite_tag, fix_mojibake(segment)))
+    return written
+
+
+def ingest_filing_streaming(source_path, out_path, fetch_assets, on_status=None):
+    """
+    Turns the raw filing at `source_path` into render-ready UTF-8 HTML at `out_path` without
+    loading it whole. `fetch_assets(urls)` downloads the assets (URLs as written in the document,
+    so they may run concurrently) and returns their local paths in the same order, None for
+    failures (those references are left untouched). Returns the list of local asset paths.
+    """
+    encoding, asset_urls, has_meta_charset, has_head = scan_filing(source_path)
+    if encoding != 'utf-8' and on_status: on_status(f"Decoded {source_path} using {encoding}", "info")
+    local_names = {}; asset_paths = []
+    for url, local_path in zip(asset_urls, fetch_assets(asset_urls) if asset_urls else ()):
+        if local_path:
+            asset_paths.append(local_path)
+            local_names[url] = local_path.replace('\\', '/').rsplit('/', 1)[-1]
+    write_filing(source_path, out_path, encoding, local_names, has_meta_charset, has_head)
+    return asset_paths
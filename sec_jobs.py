@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Background runner for per-CIK pipeline jobs.
+
+Streamlit reruns the whole script on every interaction, so a pipeline started
+inside a button handler blocks the session and its result is lost on the next
+rerun. `JobRunner` runs `process_filings_for_cik` / `sync_filings_for_cik` on
+its own threads instead. Jobs live in the process, not in a session: a rerun
+(or a reconnecting browser) looks its job up again by id and renders
+`FilingJob.snapshot()`, which holds the status messages, each filing's stage
+(queued, fetching, rendering, done, ...) and, once finished, the PDFs.
+
+Identical requests submitted while a job is still queued or running share
+that job. Each caller that submitted it is a watcher; `cancel` drops one
+watcher and only stops the job when nobody is left watching it.
+
+Files derived from a job's result (such as the download ZIP) go in its
+`scratch_dir()`, which is removed when the finished job is forgotten.
+
+Each job collects a sec_metrics.RunMetrics (`job.metrics`). If
+SEC_METRICS_FILE is set, finished jobs append their metrics to it as JSON lines.
+
+Nothing here imports Streamlit.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from sec_manifest import DEFAULT_LIBRARY_DIR, get_manifest
+from sec_metrics import RunMetrics
+from sec_pipeline import process_filings_for_cik, sync_filings_for_cik
+
+MAX_CONCURRENT_JOBS = int(os.environ.get('SEC_MAX_CONCURRENT_JOBS', 2)) # Jobs running at once; others wait queued
+JOB_RETENTION_SECONDS = 3600 # Finished jobs are forgotten after this long
+MAX_JOB_MESSAGES = 500 # Oldest status messages are dropped beyond this
+ACTIVE_STATES = ('queued', 'running')
+_KEY_IGNORED_OPTIONS = ('max_workers',) # Options that don't change the result
+METRICS_FILE = os.environ.get('SEC_METRICS_FILE') # JSON-lines export of finished jobs' metrics
+
+
+class FilingJob:
+    """One pipeline run for a CIK. Updated by the runner thread, read through `snapshot()`."""
+    def __init__(self, key, params):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.params = params
+        self.state = 'queued' # queued -> running -> done / failed / cancelled
+        self.heading = None
+        self.messages = deque(maxlen=MAX_JOB_MESSAGES) # (timestamp, level, message)
+        self.filings = {} # accession -> {'label', 'stage'}, in the order filings were started
+        self.result = ([], None) # (PDF paths, directory)
+        self.created_at = time.time(); self.started_at = None; self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.metrics = RunMetrics(params['cik'])
+        self.watchers = 0
+        self._scratch_dir = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.state in ACTIVE_STATES
+
+    def progress(self, message, level="info", exc=None):
+        """`progress` callback for the pipeline: records the message (and traceback, if any)."""
+        with self._lock:
+            if level == "heading": self.heading = message; return
+            if exc is not None: message = f"{message}\n{''.join(traceback.format_exception(type(exc), exc, exc.__traceback__))}"
+            self.messages.append((time.time(), level, message))
+
+    def on_stage(self, accession, stage, label):
+        """`on_stage` callback for the pipeline."""
+        with self._lock: self.filings[accession] = {'label': label, 'stage': stage}
+
+    def scratch_dir(self):
+        """Directory for files made from this job's result, created on first use and removed with the job."""
+        with self._lock:
+            if self._scratch_dir is None: self._scratch_dir = tempfile.mkdtemp(prefix="sec_job_")
+            return self._scratch_dir
+
+    def discard(self):
+        """Removes the job's scratch directory (called when the runner forgets the job)."""
+        with self._lock: scratch_dir, self._scratch_dir = self._scratch_dir, None
+        if scratch_dir: shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    def snapshot(self):
+        """Consistent copy of the job's state for display."""
+        with self._lock:
+            return dict(id=self.id, state=self.state, heading=self.heading, messages=list(self.messages),
+                        filings=[dict(accession=accession, **info) for accession, info in self.filings.items()],
+                        result=self.result, params=dict(self.params), watchers=self.watchers,
+                        elapsed=(self.finished_at or time.time()) - (self.started_at or time.time()))
+
+
+def job_key(params):
+    """Identity of a request: jobs with the same key produce the same PDFs."""
+    relevant = {name: value for name, value in params.items() if name not in _KEY_IGNORED_OPTIONS}
+    relevant['cik'] = str(relevant['cik']).zfill(10)
+    return json.dumps(relevant, sort_keys=True, default=str)
+
+
+class JobRunner:
+    """Runs FilingJobs on a small thread pool; see the module docstring."""
+    def __init__(self, max_concurrent_jobs=MAX_CONCURRENT_JOBS, retention=JOB_RETENTION_SECONDS):
+        self.retention = retention
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="sec_job")
+        self._jobs = {} # id -> FilingJob
+        self._lock = threading.Lock()
+
+    def submit(self, cik, ticker, fiscal_year_end_month, fy_adjust, cleanup_temp_files, incremental=False,
+               library_dir=DEFAULT_LIBRARY_DIR, **options):
+        """
+        Starts (or joins) a job for one CIK and returns it. `options` are passed to
+        `process_filings_for_cik` / `sync_filings_for_cik` (max_workers, streaming_ingest, slim, ...).
+        With `incremental`, PDFs go to `library_dir`/<CIK> and the library manifest is used.
+        """
+        params = dict(cik=cik, ticker=ticker, fiscal_year_end_month=fiscal_year_end_month, fy_adjust=fy_adjust,
+                      cleanup_temp_files=cleanup_temp_files, incremental=incremental, **options)
+        if incremental: params['library_dir'] = library_dir
+        key = job_key(params)
+        with self._lock:
+            self._prune()
+            job = next((job for job in self._jobs.values() if job.key == key and job.active and not job.cancel_event.is_set()), None)
+            if job is None:
+                job = FilingJob(key, params)
+                self._jobs[job.id] = job
+                self._pool.submit(self._run, job)
+            job.watchers += 1
+            return job
+
+    def get(self, job_id):
+        """The job with this id, or None if unknown or already forgotten."""
+        with self._lock: return self._jobs.get(job_id)
+
+    def cancel(self, job):
+        """Drops one watcher; stops the job once no one is watching it. Returns True if it was stopped."""
+        with self._lock:
+            job.watchers = max(0, job.watchers - 1)
+            if job.watchers or not job.active: return False
+            job.cancel_event.set()
+        job.progress("Cancelling...", level="warning")
+        return True
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            self._jobs.pop(job_id).discard()
+
+    def _run(self, job):
+        if job.cancel_event.is_set(): job.state = 'cancelled'; job.finished_at = time.time(); return
+        job.state = 'running'; job.started_at = time.time()
+        params = dict(job.params)
+        incremental = params.pop('incremental'); library_dir = params.pop('library_dir', None)
+        args = [params.pop(name) for name in ('cik', 'ticker', 'fiscal_year_end_month', 'fy_adjust', 'cleanup_temp_files')]
+        hooks = dict(progress=job.progress, on_stage=job.on_stage, cancel_event=job.cancel_event, metrics=job.metrics)
+        try:
+            if incremental:
+                output_dir = os.path.join(library_dir, args[0].zfill(10))
+                result = sync_filings_for_cik(*args, output_dir, get_manifest(library_dir), **params, **hooks)
+            else: result = process_filings_for_cik(*args, **params, **hooks)
+        except Exception as e: # The pipeline reports its own errors; this is a last resort
+            job.progress(f"Job failed: {e}", level="error", exc=e); result = ([], None)
+        with job._lock:
+            job.result = result
+            job.state = 'cancelled' if job.cancel_event.is_set() else 'done' if result[0] else 'failed'
+            job.finished_at = time.time()
+        if METRICS_FILE:
+            try: job.metrics.write_json_lines(METRICS_FILE)
+            except OSError as e: job.progress(f"Could not write metrics to {METRICS_FILE}: {e}", level="warning")
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+def get_job_runner():
+    """Returns the process-wide JobRunner shared by every session."""
+    global _runner
+    with _runner_lock:
+        if _runner is None: _runner = JobRunner()
+        return _runner
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Local manifest of processed filings, used by incremental sync.
+
+One SQLite row per (CIK, accession) records the form, filing date, period
+label, where the rendered PDF was written, and a fingerprint of the options
+it was produced with (`options_fingerprint`). A sync diffs the submissions
+feed against these rows and only processes accessions that are new, whose
+PDF has since been deleted, or that were produced with different options.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+MANIFEST_FILENAME = 'manifest.sqlite3'
+# Where the app keeps PDFs between runs in incremental mode (one sub-folder per CIK)
+DEFAULT_LIBRARY_DIR = os.environ.get('SEC_LIBRARY_DIR', os.path.join(tempfile.gettempdir(), 'sec_viewer_library'))
+
+
+def options_fingerprint(**options):
+    """Hash of the options that shape a PDF (fiscal-year settings, ticker, slimming), as stored in the manifest."""
+    return hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class FilingManifest:
+    """SQLite-backed record of processed filings. Safe to share between threads."""
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS filings (cik TEXT NOT NULL, accession TEXT NOT NULL, form TEXT, "
+                             "filing_date TEXT, period TEXT, pdf_path TEXT NOT NULL, processed_at REAL NOT NULL, "
+                             "options TEXT, PRIMARY KEY (cik, accession))")
+            columns = {row['name'] for row in self._db.execute("PRAGMA table_info(filings)")}
+            if 'options' not in columns: # Manifest from before options were recorded; its rows never match
+                self._db.execute("ALTER TABLE filings ADD COLUMN options TEXT")
+
+    def processed(self, cik, options=None):
+        """
+        Returns {accession: row dict} for every filing recorded for `cik` whose PDF still exists.
+        With `options` (an `options_fingerprint`), rows produced with other options are left out.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM filings WHERE cik = ?", (cik.zfill(10),)).fetchall()
+        return {row['accession']: dict(row) for row in rows
+                if os.path.exists(row['pdf_path']) and (options is None or row['options'] == options)}
+
+    def record(self, cik, accession, form, filing_date, period, pdf_path, options=None):
+        """Records (or replaces) a processed filing, with the `options_fingerprint` it was produced with."""
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO filings (cik, accession, form, filing_date, period, pdf_path, processed_at, options) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (cik.zfill(10), accession, form, filing_date, period, os.path.abspath(pdf_path), time.time(), options))
+
+    def forget(self, cik, accession=None):
+        """Removes one filing, or every filing of `cik`, so the next sync processes it again."""
+        with self._lock, self._db:
+            if accession is None: self._db.execute("DELETE FROM filings WHERE cik = ?", (cik.zfill(10),))
+            else: self._db.execute("DELETE FROM filings WHERE cik = ? AND accession = ?", (cik.zfill(10), accession))
+
+    def close(self):
+        with self._lock: self._db.close()
+
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+def get_manifest(library_dir=DEFAULT_LIBRARY_DIR):
+    """Returns the process-wide FilingManifest stored in `library_dir`."""
+    path = os.path.abspath(os.path.join(library_dir, MANIFEST_FILENAME))
+    with _manifests_lock:
+        if path not in _manifests: _manifests[path] = FilingManifest(path)
+        return _manifests[path]
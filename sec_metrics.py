@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+Structured timing and size metrics for pipeline runs.
+
+`RunMetrics` collects one run (one CIK): run-level stages such as the
+submissions fetch and the ZIP bundle, plus a `FilingMetrics` per filing with
+its stages (html_download, decode_parse, assets and one asset_fetch sample per
+asset, render, move, ...), bytes transferred and cache hits. `summary()` gives
+per-stage count/total/p50/p95/max, filings per minute and peak RSS;
+`json_lines()` exports one record per filing plus one for the run.
+
+Every observation also feeds the process-wide `MetricsRegistry`, which
+`serve_metrics(port)` exposes at /metrics in the Prometheus text format
+(stage histograms, byte and cache counters, HTTP governor stats, peak RSS).
+
+`RunMetrics(profile_accession=...)` runs that one filing under cProfile and
+writes `<profile_dir>/<accession>.prof`. Only the filing's own thread is
+profiled: asset downloads run on a thread pool and rendering in worker
+processes, so they show up as waiting time.
+
+Standard library only.
+"""
+import cProfile
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sec_render import peak_rss_mb
+
+# Upper bounds (seconds) of the Prometheus stage histogram buckets
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (`q` in 0-100) of `values`, or None if empty."""
+    if not values: return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def stage_stats(samples):
+    """count/total/p50/p95/max (seconds) of a list of stage durations."""
+    return dict(count=len(samples), total=sum(samples), p50=percentile(samples, 50), p95=percentile(samples, 95), max=max(samples))
+
+
+class MetricsRegistry:
+    """Process-wide totals across all runs, rendered by `prometheus_text()`."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {} # stage -> [bucket counts..., +Inf count, sum]
+        self._bytes = {} # kind -> bytes
+        self._cache = {} # (cache, 'hit'|'miss') -> lookups
+        self._cache_saved = {} # cache -> seconds of work saved by hits
+        self._filings = {} # outcome -> filings
+        self.runs = 0
+        self.render_worker_peak_rss_mb = 0.0
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            counts = self._stages.setdefault(stage, [0] * (len(STAGE_BUCKETS) + 1) + [0.0])
+            for i, bound in enumerate(STAGE_BUCKETS):
+                if seconds <= bound: counts[i] += 1
+            counts[-2] += 1; counts[-1] += seconds
+
+    def add_bytes(self, kind, count):
+        with self._lock: self._bytes[kind] = self._bytes.get(kind, 0) + count
+
+    def cache_lookup(self, cache, hit, saved_seconds=0.0):
+        key = (cache, 'hit' if hit else 'miss')
+        with self._lock:
+            self._cache[key] = self._cache.get(key, 0) + 1
+            if saved_seconds: self._cache_saved[cache] = self._cache_saved.get(cache, 0.0) + saved_seconds
+
+    def filing_finished(self, outcome):
+        with self._lock: self._filings[outcome] = self._filings.get(outcome, 0) + 1
+
+    def run_finished(self, render_worker_peak_rss_mb=None):
+        with self._lock:
+            self.runs += 1
+            if render_worker_peak_rss_mb: self.render_worker_peak_rss_mb = max(self.render_worker_peak_rss_mb, render_worker_peak_rss_mb)
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        from sec_http import SEC_RATE_LIMITER # Imported on first use: pulls in requests
+        lines = []
+        def family(name, kind, doc):
+            lines.append(f"# HELP {name} {doc}"); lines.append(f"# TYPE {name} {kind}")
+        with self._lock:
+            family("sec_stage_seconds", "histogram", "Time spent per pipeline stage.")
+            for stage, counts in sorted(self._stages.items()):
+                for bound, count in zip(STAGE_BUCKETS, counts):
+                    lines.append(f'sec_stage_seconds_bucket{{stage="{stage}",le="{bound:g}"}} {count}')
+                lines.append(f'sec_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {counts[-2]}')
+                lines.append(f'sec_stage_seconds_sum{{stage="{stage}"}} {counts[-1]:.6f}')
+                lines.append(f'sec_stage_seconds_count{{stage="{stage}"}} {counts[-2]}')
+            family("sec_bytes_total", "counter", "Bytes downloaded (html, assets, submissions) or written (pdf).")
+            lines += [f'sec_bytes_total{{kind="{kind}"}} {count}' for kind, count in sorted(self._bytes.items())]
+            family("sec_cache_lookups_total", "counter", "Cache lookups by cache and result.")
+            lines += [f'sec_cache_lookups_total{{cache="{cache}",result="{result}"}} {count}' for (cache, result), count in sorted(self._cache.items())]
+            family("sec_cache_saved_seconds_total", "counter", "Work saved by cache hits (render time of reused PDFs), in seconds.")
+            lines += [f'sec_cache_saved_seconds_total{{cache="{cache}"}} {seconds:.3f}' for cache, seconds in sorted(self._cache_saved.items())]
+            family("sec_filings_total", "counter", "Filings finished, by outcome.")
+            lines += [f'sec_filings_total{{outcome="{outcome}"}} {count}' for outcome, count in sorted(self._filings.items())]
+            family("sec_runs_total", "counter", "Pipeline runs finished.")
+            lines.append(f"sec_runs_total {self.runs}")
+            family("sec_peak_rss_bytes", "gauge", "Peak resident set size of this process and of the render workers.")
+            lines.append(f'sec_peak_rss_bytes{{process="main"}} {int(peak_rss_mb() * 1024 * 1024)}')
+            lines.append(f'sec_peak_rss_bytes{{process="render_worker"}} {int(self.render_worker_peak_rss_mb * 1024 * 1024)}')
+        family("sec_http_rate_limit", "gauge", "Current requests per second allowed by the SEC rate governor.")
+        lines.append(f"sec_http_rate_limit {SEC_RATE_LIMITER.rate:.3f}")
+        family("sec_http_throttle_events_total", "counter", "429/503 responses from SEC.")
+        lines.append(f"sec_http_throttle_events_total {SEC_RATE_LIMITER.throttle_events}")
+        family("sec_http_retries_total", "counter", "Retried SEC requests.")
+        lines.append(f"sec_http_retries_total {SEC_RATE_LIMITER.retries}")
+        return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry()
+
+def get_metrics_registry():
+    """Returns the process-wide MetricsRegistry."""
+    return _registry
+
+
+class _Recorder:
+    """Stage samples, byte counts and cache lookups (with the time hits saved) of one run or filing (thread-safe)."""
+    def __init__(self, registry=None):
+        self.registry = registry or get_metrics_registry()
+        self.stages = {} # stage -> [seconds, ...]
+        self.bytes = {} # kind -> bytes
+        self.cache = {} # cache -> [hits, misses, seconds saved by hits]
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """Times the block as one sample of stage `name` (also when it raises)."""
+        start = time.perf_counter()
+        try: yield
+        finally: self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self._lock: self.stages.setdefault(name, []).append(seconds)
+        self.registry.observe(name, seconds)
+
+    def add_bytes(self, kind, count):
+        if not count: return
+        with self._lock: self.bytes[kind] = self.bytes.get(kind, 0) + count
+        self.registry.add_bytes(kind, count)
+
+    def cache_lookup(self, cache, hit, saved_seconds=0.0):
+        """Counts a hit or miss of `cache`; `saved_seconds` is the work a hit avoided (e.g. a PDF render)."""
+        with self._lock:
+            counts = self.cache.setdefault(cache, [0, 0, 0.0])
+            counts[0 if hit else 1] += 1; counts[2] += saved_seconds
+        self.registry.cache_lookup(cache, hit, saved_seconds)
+
+    def _copy(self):
+        with self._lock:
+            return {name: list(samples) for name, samples in self.stages.items()}, dict(self.bytes), {name: list(counts) for name, counts in self.cache.items()}
+
+
+class FilingMetrics(_Recorder):
+    """Metrics of one filing. Created through `RunMetrics.filing`, or standalone (registry only)."""
+    def __init__(self, accession=None, label=None, run=None):
+        super().__init__(run.registry if run is not None else None)
+        self.accession = accession
+        self.label = label
+        self.run = run
+        self.outcome = None # done / failed / cancelled / reused
+        self.profile_path = None
+
+    def finish(self, outcome):
+        self.outcome = outcome
+        self.registry.filing_finished(outcome)
+
+    @contextmanager
+    def profiled(self, progress=None):
+        """Runs the block under cProfile if this is the run's `profile_accession`; otherwise does nothing."""
+        run = self.run
+        if run is None or not run.profile_accession or run.profile_accession.replace('-', '') != self.accession:
+            yield; return
+        profiler = cProfile.Profile()
+        try: profiler.enable()
+        except ValueError as e: # Another profiler is already active in this process
+            if progress: progress(f"Could not profile {self.accession}: {e}", level="warning")
+            yield; return
+        try: yield
+        finally:
+            profiler.disable()
+            self.profile_path = os.path.join(run.profile_dir or tempfile.gettempdir(), f"{self.accession}.prof")
+            profiler.dump_stats(self.profile_path)
+            if progress: progress(f"cProfile stats for {self.accession} written to {self.profile_path}", level="info")
+
+    def as_record(self):
+        """JSON-ready dict: total seconds per stage, bytes, cache hits/misses/seconds saved."""
+        stages, byte_counts, cache = self._copy()
+        return dict(accession=self.accession, label=self.label, outcome=self.outcome,
+                    stages={name: round(sum(samples), 6) for name, samples in stages.items()},
+                    asset_count=len(stages.get('asset_fetch', [])), bytes=byte_counts,
+                    cache={name: dict(hits=hits, misses=misses, saved_seconds=round(saved, 6)) for name, (hits, misses, saved) in cache.items()},
+                    profile_path=self.profile_path)
+
+
+class RunMetrics(_Recorder):
+    """
+    Metrics of one pipeline run: run-level stages plus one FilingMetrics per accession.
+    `profile_accession` (optional) is profiled with cProfile, stats written to `profile_dir`.
+    """
+    def __init__(self, cik=None, profile_accession=None, profile_dir=None, registry=None):
+        super().__init__(registry)
+        self.run_id = uuid.uuid4().hex[:12]
+        self.cik = cik
+        self.profile_accession = profile_accession
+        self.profile_dir = profile_dir
+        self.started_at = time.time(); self._start = time.perf_counter()
+        self.wall_seconds = None # Set by finish()
+        self.peak_rss_mb = None; self.render_worker_peak_rss_mb = None
+        self.filings = {} # accession -> FilingMetrics, in the order filings were started
+
+    def filing(self, accession, label=None):
+        """The FilingMetrics for `accession`, created on first use."""
+        with self._lock:
+            filing = self.filings.get(accession)
+            if filing is None: filing = self.filings[accession] = FilingMetrics(accession, label, self)
+            elif label and not filing.label: filing.label = label
+            return filing
+
+    def finish(self, render_worker_peak_rss_mb=None):
+        """Marks the end of the run and records peak RSS (this process and the render workers)."""
+        self.wall_seconds = time.perf_counter() - self._start
+        self.peak_rss_mb = peak_rss_mb()
+        self.render_worker_peak_rss_mb = render_worker_peak_rss_mb
+        self.registry.run_finished(render_worker_peak_rss_mb)
+
+    def stage_samples(self):
+        """All samples per stage, run-level and from every filing: {stage: [seconds, ...]}."""
+        stages = self._copy()[0]
+        with self._lock: filings = list(self.filings.values())
+        for filing in filings:
+            for name, samples in filing._copy()[0].items(): stages.setdefault(name, []).extend(samples)
+        return stages
+
+    def summary(self):
+        """
+        Per-run aggregates: wall time, filings by outcome and per minute, per-stage
+        count/total/p50/p95/max over all samples (run and filings), bytes, cache hits/misses and
+        seconds saved, peak RSS.
+        """
+        stages = self.stage_samples()
+        _, byte_counts, cache = self._copy()
+        with self._lock: filings = list(self.filings.values())
+        outcomes = {}
+        for filing in filings:
+            _, filing_bytes, filing_cache = filing._copy()
+            for kind, count in filing_bytes.items(): byte_counts[kind] = byte_counts.get(kind, 0) + count
+            for name, (hits, misses, saved) in filing_cache.items():
+                counts = cache.setdefault(name, [0, 0, 0.0]); counts[0] += hits; counts[1] += misses; counts[2] += saved
+            if filing.outcome: outcomes[filing.outcome] = outcomes.get(filing.outcome, 0) + 1
+        wall = self.wall_seconds if self.wall_seconds is not None else time.perf_counter() - self._start
+        return dict(run_id=self.run_id, cik=self.cik, started_at=self.started_at, wall_seconds=wall, finished=self.wall_seconds is not None,
+                    filings=outcomes, filings_per_minute=outcomes.get('done', 0) / wall * 60 if wall > 0 else 0.0,
+                    stages={name: stage_stats(samples) for name, samples in stages.items()}, bytes=byte_counts,
+                    cache={name: dict(hits=hits, misses=misses, saved_seconds=saved) for name, (hits, misses, saved) in cache.items()},
+                    peak_rss_mb=self.peak_rss_mb if self.peak_rss_mb is not None else peak_rss_mb(),
+                    render_worker_peak_rss_mb=self.render_worker_peak_rss_mb)
+
+    def filing_records(self):
+        with self._lock: filings = list(self.filings.values())
+        return [filing.as_record() for filing in filings]
+
+    def json_lines(self):
+        """One JSON object per filing ("type": "filing") followed by the run summary ("type": "run")."""
+        common = dict(run_id=self.run_id, cik=self.cik)
+        records = [dict(type="filing", **common, **record) for record in self.filing_records()]
+        records.append(dict(type="run", **self.summary()))
+        return "".join(json.dumps(record, sort_keys=True) + "\n" for record in records)
+
+    def write_json_lines(self, path):
+        """Appends `json_lines()` to the file at `path`."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f: f.write(self.json_lines())
+
+
+def format_summary(summary, stages=('html_download', 'assets', 'render')):
+    """One-line human-readable digest of `RunMetrics.summary()`."""
+    parts = [f"{summary['filings'].get('done', 0)} filing(s) in {summary['wall_seconds']:.1f}s ({summary['filings_per_minute']:.1f}/min)"]
+    for name in stages:
+        stats = summary['stages'].get(name)
+        if stats: parts.append(f"{name} p50 {stats['p50']:.2f}s / p95 {stats['p95']:.2f}s")
+    downloaded = sum(count for kind, count in summary['bytes'].items() if kind != 'pdf')
+    parts.append(f"{downloaded / 1e6:.1f} MB downloaded, peak RSS {summary['peak_rss_mb']:.0f} MB")
+    return "; ".join(parts)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+            self.send_error(404); return
+        body = get_metrics_registry().prometheus_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args): pass # Scrapes are not worth a log line
+
+
+_server = None
+_server_lock = threading.Lock()
+
+def serve_metrics(port, host='127.0.0.1'):
+    """
+    Serves the registry at http://host:port/metrics from a daemon thread (started once per
+    process; later calls return the running server). Raises OSError if the port is taken.
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="sec_metrics_http", daemon=True).start()
+            _server = server
+        return _server
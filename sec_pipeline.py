@@ -0,0 +1,609 @@
+# -*- coding: utf-8 -*-
+"""
+Headless SEC filing pipeline: fetch the submissions list, download each 10-K/10-Q
+with its assets, and render PDFs.
+
+Nothing here imports Streamlit, and WeasyPrint is only imported inside the
+render workers, so the module loads quickly and can run from cron, workers or
+tests. Status is reported through a `progress(message, level="info", exc=None)`
+callback; levels are "info", "success", "warning", "error" and "heading". The
+default, `print_progress`, writes to stdout. Stage timings, bytes and cache hits
+go to an optional `metrics` collector (sec_metrics.RunMetrics). The Streamlit
+app and `sec_cli` both use this module.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlparse, urljoin
+
+import requests
+
+from sec_http import MAX_CONNECTIONS_PER_HOST, host_slot, sec_get # Pooled client + shared SEC rate governor (10 req/s policy)
+from sec_render import get_render_engine, render_fingerprint, RenderTimeout # Warm WeasyPrint process pool
+from sec_cache import archive_key, get_filing_cache, get_pdf_cache # Persistent caches for archive documents and rendered PDFs
+from sec_ingest import STREAMING_INGEST_THRESHOLD_BYTES, ingest_filing_streaming, stream_response_to_file # Low-memory path for huge filings
+from sec_submissions import SUBMISSIONS_BASE_URL, get_submissions_cache # Conditional-GET cache for submissions JSON
+from sec_selection import MIN_FISCAL_YEAR, iter_selected_filings # Columnar 10-K/10-Q selection incl. history pages
+from sec_slim import slim_filing # Optional render-slimming pass (hidden XBRL, big images, selected Items)
+from sec_metrics import FilingMetrics, RunMetrics # Per-stage timings, bytes and cache hits
+from sec_manifest import options_fingerprint # Options a manifest row was produced with (incremental sync)
+
+# --- Configuration ---
+
+# Use a more descriptive User-Agent
+HEADERS = {
+    # IMPORTANT: Replace with your actual contact info/app name if deploying publicly
+    'User-Agent': 'Streamlit SEC Filing Viewer App (sec-viewer-contact@example.com)'
+}
+
+# Filing documents live under ARCHIVES_BASE_URL/{cik}/{accession}/ (overridable, e.g. for the offline benchmark server)
+ARCHIVES_BASE_URL = os.environ.get('SEC_ARCHIVES_BASE_URL', "https://www.sec.gov/Archives/edgar/data/")
+
+# Default number of filings processed concurrently (1 = sequential, original behaviour)
+DEFAULT_PIPELINE_WORKERS = 4
+MAX_FILINGS_PER_RUN = 20 # PDFs generated per CIK per run
+
+# --- Helper Functions ---
+
+def print_progress(message, level="info", exc=None):
+    """Default progress callback: prints status to the console."""
+    print(f"STATUS ({level}): {message}")
+    if exc is not None:
+        import traceback
+        traceback.print_exception(type(exc), exc, exc.__traceback__)
+
+def get_filing_period(form, filing_date, fiscal_year_end_month, fy_adjust, progress=print_progress):
+    """
+    Determines the filing period label (e.g., FY23, 1Q24).
+    (Copied logic from original, ensure it matches requirements)
+    """
+    reported_year = filing_date.year if filing_date.month > fiscal_year_end_month else filing_date.year - 1
+    filing_month = filing_date.month
+
+    if fy_adjust == "Previous Year":
+        reported_year -= 1
+
+    if form == "10-K":
+        return f"FY{reported_year % 100:02d}"
+    elif form == "10-Q":
+        # Logic to determine quarter based on filing month relative to FY end
+        if fiscal_year_end_month == 12: # Calendar Year End
+             if 1 <= filing_month <= 3: quarter, year = 3, reported_year  # Filed in Q1 -> Reports Q3 of Prev FY cycle
+             elif 4 <= filing_month <= 6: quarter, year = 4, reported_year  # Filed in Q2 -> Reports Q4/FY of Prev FY cycle (unlikely for 10-Q, more like 10-K)
+             elif 7 <= filing_month <= 9: quarter, year = 1, reported_year + 1 # Filed in Q3 -> Reports Q1 of Current FY cycle
+             elif 10 <= filing_month <= 12: quarter, year = 2, reported_year + 1 # Filed in Q4 -> Reports Q2 of Current FY cycle
+             else: quarter, year = 0, 0 # Should not happen
+        elif fiscal_year_end_month == 3: # March Year End
+            if 4 <= filing_month <= 6: quarter, year = 4, reported_year # Filed Apr-Jun -> Reports Q4/FY of Prev FY cycle
+            elif 7 <= filing_month <= 9: quarter, year = 1, reported_year + 1 # Filed Jul-Sep -> Reports Q1 of Current FY cycle
+            elif 10 <= filing_month <= 12: quarter, year = 2, reported_year + 1 # Filed Oct-Dec -> Reports Q2 of Current FY cycle
+            elif 1 <= filing_month <= 3: quarter, year = 3, reported_year + 1 # Filed Jan-Mar -> Reports Q3 of Current FY cycle
+            else: quarter, year = 0, 0 # Should not happen
+        else:
+             # Generic logic attempt (may need refinement for specific FY ends)
+             months_past_fy_end = (filing_date.month - fiscal_year_end_month - 1 + 12) % 12
+             quarter = (months_past_fy_end // 3) + 1
+             year = reported_year
+             if filing_date.month > fiscal_year_end_month:
+                  year += 1
+
+        if quarter == 4:
+             progress(f"Warning: Calculated Q4 for a 10-Q filing ({filing_date.strftime('%Y-%m-%d')}). Using FY label.", level="warning")
+             return f"FY{year % 100:02d}"
+        elif quarter > 0:
+             return f"{quarter}Q{year % 100:02d}"
+        else:
+            progress(f"Error calculating period for 10-Q filed {filing_date.strftime('%Y-%m-%d')}, FYEnd: {fiscal_year_end_month}", level="error")
+            return f"ERR{reported_year % 100:02d}"
+    else:
+        return f"Form{form}-{reported_year % 100:02d}"
+
+
+def download_asset(asset_rel_url, base_doc_url, temp_dir, asset_number, cache=None, metrics=None, progress=print_progress):
+    """
+    Downloads one asset (image, css, script) into `temp_dir` and returns its local path, or None on failure.
+    Archive assets are served from the persistent filing cache when present.
+    `asset_number` names assets whose URL has no file name. Safe to call from several threads:
+    the file is written under a temporary name and moved into place.
+    Time, bytes and cache use are recorded on `metrics` (a sec_metrics.FilingMetrics) as "asset_fetch".
+    """
+    absolute_url = urljoin(base_doc_url, asset_rel_url)
+    metrics = metrics if metrics is not None else FilingMetrics()
+    with metrics.stage('asset_fetch'):
+        try:
+            cache_key = archive_key(absolute_url) if cache else None
+            cached = cache.get(cache_key) if cache_key else None # (blob_path, content_type) or None
+            if cache_key: metrics.cache_lookup('asset', bool(cached))
+            fd, part_path = tempfile.mkstemp(dir=temp_dir, prefix='.asset_')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    if cached:
+                        content_type = cached[1] or ''
+                        with open(cached[0], 'rb') as blob: shutil.copyfileobj(blob, f)
+                    else:
+                        with host_slot(absolute_url): # Per-host connection cap
+                            response = sec_get(absolute_url, headers=HEADERS, stream=True, timeout=20)
+                            response.raise_for_status()
+                            content_type = response.headers.get('content-type', '')
+                            for chunk in response.iter_content(chunk_size=65536): f.write(chunk)
+                        metrics.add_bytes('assets', f.tell())
+                parsed_url = urlparse(absolute_url)
+                filename = os.path.basename(parsed_url.path)
+                if not filename:
+                    content_type = content_type.split(';')[0]
+                    ext = '.css' if 'css' in content_type else '.jpg' if 'jpeg' in content_type else '.png' if 'png' in content_type else '.js' if 'javascript' in content_type else '.asset'
+                    filename = f"asset_{asset_number}{ext}"
+                filename = "".join(c for c in filename if c.isalnum() or c in ('-', '_', '.'))[:100]
+                local_path = os.path.join(temp_dir, filename)
+                if cache_key and not cached: cache.put_file(cache_key, part_path, content_type)
+                os.replace(part_path, local_path)
+            finally:
+                if os.path.exists(part_path): os.remove(part_path)
+            return local_path
+        except requests.exceptions.Timeout:
+             progress(f"Timeout downloading asset {asset_rel_url}", level="warning")
+        except requests.exceptions.RequestException as e:
+            progress(f"Failed to download asset {asset_rel_url}: {e}", level="warning")
+        except Exception as e:
+            progress(f"Error processing asset {asset_rel_url}: {e}", level="warning")
+    return None
+
+def download_asset_urls(asset_urls, base_doc_url, temp_dir, metrics=None, progress=print_progress):
+    """
+    Downloads the given asset URLs concurrently (up to MAX_CONNECTIONS_PER_HOST at a time)
+    over the shared connection pool. Returns local paths (None for failures) in the same order.
+    """
+    cache = get_filing_cache()
+    fetch = lambda numbered: download_asset(numbered[1], base_doc_url, temp_dir, numbered[0], cache, metrics=metrics, progress=progress)
+    if len(asset_urls) <= 1: return [fetch(numbered) for numbered in enumerate(asset_urls, 1)]
+    with ThreadPoolExecutor(max_workers=min(MAX_CONNECTIONS_PER_HOST, len(asset_urls)), thread_name_prefix="sec_asset") as pool:
+        return list(pool.map(fetch, enumerate(asset_urls, 1)))
+
+def download_assets(soup, base_doc_url, temp_dir, asset_refs=None, metrics=None, progress=print_progress):
+    """
+    Downloads assets (images, css) linked in the HTML to a temporary directory.
+    `asset_refs` ([(tag, attr, url)] from `preprocess_html`) avoids walking the tree again.
+    Each distinct URL is fetched once; the downloads run concurrently (see `download_asset_urls`).
+    """
+    if asset_refs is None:
+        from sec_preprocess import collect_asset_refs
+        asset_refs = collect_asset_refs(soup)
+    asset_urls = list(dict.fromkeys(url for _, _, url in asset_refs))
+    local_paths = dict(zip(asset_urls, download_asset_urls(asset_urls, base_doc_url, temp_dir, metrics=metrics, progress=progress)))
+    for tag, url_attr, asset_rel_url in asset_refs:
+        if local_paths[asset_rel_url]: tag[url_attr] = os.path.basename(local_paths[asset_rel_url])
+    return [local_path for local_path in local_paths.values() if local_path]
+
+def convert_to_pdf_weasyprint(html_path, pdf_base_name, temp_dir, asset_paths=(), metrics=None, progress=print_progress):
+    """
+    Converts HTML to PDF using WeasyPrint (rendered by the shared process pool in sec_render).
+    If a PDF with the same render fingerprint (HTML, assets, stylesheet, WeasyPrint version)
+    is already in the PDF cache, it is reused instead of rendering again.
+    PDF cache use and output size are recorded on `metrics` (a sec_metrics.FilingMetrics), if given.
+    """
+    try:
+        pdf_filename = f"{pdf_base_name}.pdf"
+        pdf_path = os.path.join(temp_dir, pdf_filename)
+        engine = get_render_engine(); pdf_cache = get_pdf_cache()
+        fingerprint = render_fingerprint(html_path, list(asset_paths), engine.stylesheet) if pdf_cache else None
+        saved_seconds = pdf_cache.fetch(fingerprint, pdf_path) if fingerprint else None
+        cache_hit = saved_seconds is not None
+        if metrics is not None and fingerprint: metrics.cache_lookup('pdf', cache_hit, saved_seconds or 0.0)
+        if cache_hit:
+            progress(f"PDF reused from cache: {pdf_filename}", level="success")
+            return pdf_path
+        progress(f"Converting to PDF (WeasyPrint): {pdf_filename} ...", level="info")
+        render_start = time.monotonic()
+        pdf_size = engine.render(html_path, pdf_path)
+        if pdf_size > 0:
+            if pdf_cache: pdf_cache.store_pdf(fingerprint, pdf_path, time.monotonic() - render_start)
+            if metrics is not None: metrics.add_bytes('pdf', pdf_size)
+            progress(f"PDF created: {pdf_filename}", level="success")
+            return pdf_path
+        else:
+            progress("WeasyPrint conversion failed - no output file or file is empty", level="error")
+            if os.path.exists(pdf_path): os.remove(pdf_path)
+            return None
+    except ImportError:
+        progress("WeasyPrint not installed. Install WeasyPrint (`pip install WeasyPrint`) and its system dependencies (Pango, Cairo, etc.).", level="error")
+        return None
+    except RenderTimeout as e:
+        progress(f"WeasyPrint PDF conversion timed out: {e}", level="error")
+        return None
+    except Exception as e:
+        progress(f"Error during WeasyPrint PDF conversion: {str(e)}", level="error", exc=e)
+        return None
+
+def report_slimming(report, render_seconds, progress=print_progress):
+    """
+    Reports what `sec_slim.slim_filing` removed. Render time scales roughly with the HTML size,
+    so the time saved is estimated from the measured render time and the size ratio.
+    """
+    before, after = report['html_bytes_before'], report['html_bytes_after']
+    saved_seconds = render_seconds * (before / after - 1) if after else 0.0
+    images = f", {report['images_downsampled']} image(s) downsampled (-{report['image_bytes_saved'] / 1e6:.1f} MB)" if report['images_downsampled'] else ""
+    if report['sections_found'] == []: progress("No Item headings found; rendering the whole document.", level="warning")
+    progress(f"Slimmed HTML {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB{images}; ~{saved_seconds:.1f}s of rendering saved (estimated).", level="info")
+
+class FilingCancelled(Exception):
+    """Raised inside `download_and_process` when the run's cancel event is set."""
+
+def download_and_process(doc_url, cik, form, date_str, accession, period, ticker, cleanup_temp_files, stage_gates=None, streaming_ingest=None,
+                         slim=None, on_stage=None, cancel_event=None, metrics=None, progress=print_progress):
+    """
+    Downloads a single filing, its assets, converts to PDF, and optionally cleans up.
+    `stage_gates` (optional) maps 'fetch', 'assets' and 'render' to semaphores that bound
+    how many filings may be in each stage at once (see `run_filing_pipeline`).
+    `streaming_ingest` selects the low-memory path in sec_ingest (True/False); None picks it
+    automatically for documents larger than STREAMING_INGEST_THRESHOLD_BYTES.
+    `slim` (optional) is a dict of `sec_slim.slim_filing` options (e.g. {'sections': ['7']}); if set,
+    hidden XBRL, oversized images and unselected Items are removed before rendering.
+    `on_stage(accession, stage, label)` (optional) is called as the filing moves through "queued",
+    "fetching", "rendering" and finally "done", "failed" or "cancelled". If `cancel_event` (a
+    threading.Event) is set, the filing stops at the next stage boundary and returns None.
+    `metrics` (optional sec_metrics.RunMetrics) receives this filing's stage timings, bytes and
+    cache hits; if it names this accession as `profile_accession`, the filing runs under cProfile.
+    Status messages go to `progress(message, level, exc=None)`.
+    """
+    from sec_preprocess import preprocess_html # Imported on first use: pulls in BeautifulSoup/lxml
+    gates = stage_gates or {}
+    temp_dir_filing = tempfile.mkdtemp(prefix=f"sec_{cik}_{accession}_")
+    html_path = None; assets_paths = []; pdf_path_final = None; outcome = "failed"
+    label = f"{form} {period} ({date_str})"
+    filing_metrics = metrics.filing(accession, label) if metrics is not None else FilingMetrics(accession, label)
+    filing_start = time.perf_counter()
+    def enter_stage(stage):
+        if cancel_event is not None and cancel_event.is_set(): raise FilingCancelled()
+        if on_stage: on_stage(accession, stage, label)
+    @contextmanager
+    def gate(name):
+        """Holds the stage gate `name` (if any), recording the time spent waiting for it."""
+        if name not in gates: yield; return
+        wait_start = time.perf_counter()
+        with gates[name]:
+            filing_metrics.record(f"{name}_wait", time.perf_counter() - wait_start)
+            yield
+    with filing_metrics.profiled(progress):
+        try:
+            enter_stage("queued")
+            progress(f"Processing {form} ({period}) from {date_str}...", level="info")
+            html_filename = f"{cik}_{form}_{date_str}_{accession}.html"
+            html_path = os.path.join(temp_dir_filing, html_filename)
+            source_path = None # Raw document on disk (streaming ingest only)
+            with gate('fetch'):
+                enter_stage("fetching")
+                with filing_metrics.stage('html_download'):
+                    cache = get_filing_cache(); cache_key = archive_key(doc_url) if cache else None
+                    cached = cache.get(cache_key) if cache_key else None # (blob_path, content_type) or None
+                    if cache_key: filing_metrics.cache_lookup('archive', bool(cached))
+                    if cached:
+                        progress(f"Using cached copy of {doc_url}", level="info")
+                        use_streaming = streaming_ingest if streaming_ingest is not None else os.path.getsize(cached[0]) > STREAMING_INGEST_THRESHOLD_BYTES
+                        if use_streaming: source_path = os.path.join(temp_dir_filing, "_source.raw"); shutil.copyfile(cached[0], source_path)
+                        else:
+                            with open(cached[0], 'rb') as f: content = f.read()
+                    else:
+                        response = sec_get(doc_url, headers=HEADERS, timeout=30, stream=True)
+                        response.raise_for_status()
+                        content_length = int(response.headers.get('content-length') or 0)
+                        use_streaming = streaming_ingest if streaming_ingest is not None else content_length > STREAMING_INGEST_THRESHOLD_BYTES
+                        if use_streaming:
+                            source_path = os.path.join(temp_dir_filing, "_source.raw")
+                            stream_response_to_file(response, source_path)
+                            filing_metrics.add_bytes('html', os.path.getsize(source_path))
+                            if cache_key: cache.put_file(cache_key, source_path, response.headers.get('content-type'))
+                        else:
+                            content = response.content
+                            filing_metrics.add_bytes('html', len(content))
+                            if cache_key: cache.put(cache_key, content, response.headers.get('content-type'))
+                if not source_path:
+                    with filing_metrics.stage('decode_parse'):
+                        try: decoded_text = content.decode('utf-8')
+                        except UnicodeDecodeError:
+                            try: decoded_text = content.decode('iso-8859-1'); progress(f"Decoded {doc_url} using iso-8859-1", level="info")
+                            except UnicodeDecodeError: decoded_text = content.decode('cp1252', errors='replace'); progress(f"Decoded {doc_url} using cp1252 (replacements)", level="warning")
+                        del content
+                        soup, asset_refs = preprocess_html(decoded_text) # lxml when available; one pass for mojibake, meta charset and assets
+                        del decoded_text
+            with gate('assets'):
+                if source_path:
+                    progress(f"Low-memory streaming ingest for {doc_url}", level="info")
+                    with filing_metrics.stage('stream_ingest'): # Parse, rewrite and asset fetches in one pass
+                        assets_paths = ingest_filing_streaming(
+                            source_path, html_path,
+                            fetch_assets=lambda urls: download_asset_urls(urls, doc_url, temp_dir_filing, metrics=filing_metrics, progress=progress),
+                            on_status=lambda message, level: progress(message, level=level))
+                    os.remove(source_path)
+                else:
+                    with filing_metrics.stage('assets'):
+                        assets_paths = download_assets(soup, doc_url, temp_dir_filing, asset_refs, metrics=filing_metrics, progress=progress)
+                    with filing_metrics.stage('serialize'):
+                        with open(html_path, 'w', encoding='utf-8') as f: f.write(str(soup))
+                    del soup
+                if slim is not None:
+                    with filing_metrics.stage('slim'): slim_report = slim_filing(html_path, assets_paths, **slim)
+                else: slim_report = None
+            pdf_base_name = f"{ticker}_{period}" if ticker else f"{cik}_{period}"
+            with gate('render'):
+                enter_stage("rendering")
+                render_start = time.monotonic()
+                with filing_metrics.stage('render'):
+                    pdf_path_temp = convert_to_pdf_weasyprint(html_path, pdf_base_name, temp_dir_filing, assets_paths, metrics=filing_metrics, progress=progress)
+                if slim_report and pdf_path_temp: report_slimming(slim_report, time.monotonic() - render_start, progress)
+            if pdf_path_temp: pdf_path_final = pdf_path_temp; outcome = "done"
+            return pdf_path_final
+        except FilingCancelled: outcome = "cancelled"; return None
+        except requests.exceptions.Timeout: progress(f"Timeout downloading main HTML {doc_url}", level="error"); return None
+        except requests.exceptions.RequestException as e: progress(f"Network error downloading {doc_url}: {e}", level="error"); return None
+        except Exception as e: progress(f"Error processing filing {accession}: {e}", level="error", exc=e); return None
+        finally:
+            # On success the PDF still lives in temp_dir_filing: the caller moves it out and then
+            # removes the directory if cleanup_temp_files is set
+            should_cleanup = pdf_path_final is None
+            if should_cleanup:
+                try:
+                    if temp_dir_filing and os.path.exists(temp_dir_filing): shutil.rmtree(temp_dir_filing, ignore_errors=True)
+                except Exception as e: progress(f"Error during cleanup for {accession}: {e}", level="warning")
+            # No message if temp files kept intentionally via cleanup=False
+            filing_metrics.record('filing', time.perf_counter() - filing_start); filing_metrics.finish(outcome)
+            if on_stage: on_stage(accession, outcome, label)
+
+def run_filing_pipeline(jobs, max_workers=DEFAULT_PIPELINE_WORKERS, max_results=None):
+    """
+    Runs `download_and_process(**job)` for each job and yields (job, pdf_path) in job order.
+    With max_workers > 1, filings overlap: one can be rendering while the next downloads
+    assets and another fetches its HTML. Each stage is bounded by its own semaphore, and the
+    number of filings in flight is capped so we never fetch far ahead of the consumer.
+    All HTTP goes through `sec_get`, so the SEC rate limit holds across every worker.
+    `max_results` (optional) is the number of PDFs the consumer wants: filings in flight plus
+    PDFs produced never exceed it, so stopping at that limit wastes no downloads or renders
+    (a failed filing frees its slot for the next one).
+    If the consumer stops early anyway (e.g. cancelled), pending filings are
+    cancelled and any PDFs they already produced are deleted.
+    With max_workers <= 1 filings are processed lazily one at a time (sequential path).
+    """
+    if max_workers <= 1:
+        for job in jobs: yield job, download_and_process(**job)
+        return
+    render_workers = max(1, min(max_workers, os.cpu_count() or 1)) # Rendering is CPU-bound
+    stage_gates = {'fetch': threading.BoundedSemaphore(max_workers), 'assets': threading.BoundedSemaphore(max_workers),
+                   'render': threading.BoundedSemaphore(render_workers)}
+    jobs = iter(jobs); in_flight = deque(); max_in_flight = max_workers * 2
+    pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="sec_filing")
+    produced = 0
+    def submit_next():
+        if max_results is not None and produced + len(in_flight) >= max_results: return False
+        job = next(jobs, None)
+        if job is None: return False
+        in_flight.append((job, pool.submit(download_and_process, **job, stage_gates=stage_gates)))
+        return True
+    try:
+        while len(in_flight) < max_in_flight and submit_next(): pass
+        while in_flight:
+            job, future = in_flight.popleft()
+            pdf_path = future.result() # download_and_process reports its own errors and returns None
+            if pdf_path: produced += 1
+            submit_next()
+            yield job, pdf_path
+    finally:
+        # Consumer stopped early: drop queued filings, discard PDFs from ones already running
+        for job, future in in_flight: future.cancel()
+        pool.shutdown(wait=True)
+        for job, future in in_flight:
+            if future.cancelled(): continue
+            try: leftover = future.result()
+            except Exception: leftover = None
+            if leftover and os.path.exists(leftover): shutil.rmtree(os.path.dirname(leftover), ignore_errors=True)
+
+def iter_filing_jobs(data, base_url, cik_padded, ticker, fiscal_year_end_month, fy_adjust, cleanup_temp_files, streaming_ingest=None, progress=print_progress,
+                     min_fiscal_year=MIN_FISCAL_YEAR, start_date=None, end_date=None, slim=None, on_stage=None, cancel_event=None, metrics=None):
+    """
+    Yields `download_and_process` keyword arguments for each eligible 10-K/10-Q in the submissions
+    `data`, newest first. Selection is columnar (see sec_selection); older history pages are only
+    fetched if the caller keeps iterating past the recent filings.
+    """
+    fetch_page = lambda name: fetch_submissions(cik_padded, progress, name=name, metrics=metrics)
+    for form, filing_date_str, accession, period, doc_file in iter_selected_filings(
+            data, fetch_page, fiscal_year_end_month, fy_adjust, min_fiscal_year, start_date, end_date, progress):
+        yield dict(doc_url=f"{base_url}{accession}/{doc_file}", cik=cik_padded, form=form, date_str=filing_date_str, accession=accession,
+                   period=period, ticker=ticker, cleanup_temp_files=cleanup_temp_files, streaming_ingest=streaming_ingest,
+                   slim=slim, on_stage=on_stage, cancel_event=cancel_event, metrics=metrics, progress=progress)
+
+def move_pdf_to_dir(pdf_path_temp, dest_dir, cleanup_temp_files, progress=print_progress):
+    """
+    Moves a freshly rendered PDF into `dest_dir` without overwriting (adds _1, _2, ...) and removes
+    its filing temp directory if `cleanup_temp_files`. Returns the final path, or None on error.
+    """
+    try:
+        final_pdf_name = os.path.basename(pdf_path_temp)
+        final_pdf_path = os.path.join(dest_dir, final_pdf_name)
+        counter = 1
+        while os.path.exists(final_pdf_path): # Avoid overwrites
+             name, ext = os.path.splitext(final_pdf_name); final_pdf_path = os.path.join(dest_dir, f"{name}_{counter}{ext}"); counter += 1
+        shutil.move(pdf_path_temp, final_pdf_path)
+        source_temp_dir = os.path.dirname(pdf_path_temp)
+        if cleanup_temp_files and os.path.exists(source_temp_dir):
+             try: shutil.rmtree(source_temp_dir, ignore_errors=True)
+             except Exception: pass
+        return final_pdf_path
+    except Exception as move_err: progress(f"Error moving PDF {os.path.basename(pdf_path_temp)}: {move_err}", level="error"); return None
+
+def fetch_submissions(cik_padded, progress=print_progress, name=None, metrics=None):
+    """
+    Returns data.sec.gov/submissions/CIK##########.json for a zero-padded CIK, or the history page
+    `name` listed in its `filings['files']`, served from the revalidating submissions cache when
+    possible (see sec_submissions). Time, bytes and cache use go to `metrics` as "submissions".
+    """
+    if name is None:
+        name = f"CIK{cik_padded}.json"
+        progress(f"Fetching filing list for CIK {cik_padded}...", level="info")
+    else: progress(f"Fetching filing history page {name}...", level="info")
+    submissions_url = f"{SUBMISSIONS_BASE_URL}{name}"
+    metrics = metrics if metrics is not None else RunMetrics()
+    responses = []
+    def fetch(extra_headers):
+        response = sec_get(submissions_url, headers={**HEADERS, **extra_headers}, timeout=20)
+        responses.append(response); return response
+    cache = get_submissions_cache()
+    with metrics.stage('submissions'):
+        if cache: data = cache.get(name, fetch, progress)
+        else:
+            response = fetch({})
+            response.raise_for_status()
+            data = response.json()
+    if cache: metrics.cache_lookup('submissions', not responses or responses[-1].status_code == 304)
+    if responses and responses[-1].status_code == 200: metrics.add_bytes('submissions', int(responses[-1].headers.get('content-length') or 0))
+    return data
+
+def prepare_filing_jobs(data, cik_padded, ticker, fiscal_year_end_month, fy_adjust, cleanup_temp_files, streaming_ingest=None, progress=print_progress,
+                        min_fiscal_year=MIN_FISCAL_YEAR, start_date=None, end_date=None, slim=None, on_stage=None, cancel_event=None, metrics=None):
+    """
+    Checks the submissions data and returns (company_name, ticker, jobs), where jobs lazily yields
+    `download_and_process` arguments. The ticker falls back to the first one in the SEC data.
+    `start_date`/`end_date` bound the filing dates and `min_fiscal_year` is the fiscal-year cutoff.
+    `slim`, `on_stage`, `cancel_event` and `metrics` are passed to every job (see `download_and_process`).
+    Returns None (after reporting why) if the data can't be used.
+    """
+    if 'filings' not in data or 'recent' not in data['filings']:
+         progress(f"No recent filings found for CIK {cik_padded}.", level="error"); return None
+    filings = data['filings']['recent']
+    company_name = data.get('name', f"CIK {cik_padded}")
+    if not ticker and data.get('tickers') and isinstance(data['tickers'], list) and len(data['tickers']) > 0:
+        ticker = data['tickers'][0]; progress(f"Using ticker '{ticker}' from SEC data.", level="info")
+    if not all(key in filings for key in ['form', 'filingDate', 'accessionNumber', 'primaryDocument']):
+        progress("Filings data missing expected keys.", level="error"); return None
+    base_url = f"{ARCHIVES_BASE_URL}{cik_padded}/"
+    jobs = iter_filing_jobs(data, base_url, cik_padded, ticker, fiscal_year_end_month, fy_adjust, cleanup_temp_files, streaming_ingest, progress,
+                            min_fiscal_year, start_date, end_date, slim, on_stage, cancel_event, metrics)
+    return company_name, ticker, jobs
+
+def process_filings_for_cik(cik, ticker, fiscal_year_end_month, fy_adjust, cleanup_temp_files, max_workers=DEFAULT_PIPELINE_WORKERS,
+                            streaming_ingest=None, progress=print_progress, max_filings=MAX_FILINGS_PER_RUN,
+                            min_fiscal_year=MIN_FISCAL_YEAR, start_date=None, end_date=None, slim=None, on_stage=None, cancel_event=None,
+                            metrics=None):
+    """
+    Fetches filing list and processes 10-K/10-Q forms.
+    Filings are processed by `run_filing_pipeline` with `max_workers` concurrent filings
+    (1 = sequential); results are collected in filing order either way.
+    `streaming_ingest` is passed to `download_and_process` (None = automatic by document size).
+    `min_fiscal_year`, `start_date` and `end_date` narrow the selection (see `prepare_filing_jobs`);
+    `slim` enables the render-slimming pass and `on_stage` receives per-filing stages (see
+    `download_and_process`). Setting `cancel_event` stops the run; PDFs finished so far are kept.
+    Pass a sec_metrics.RunMetrics as `metrics` to get per-stage timings, bytes and cache hits.
+    Status messages go to `progress(message, level, exc=None)`; level "heading" announces the company.
+    Returns (list of final PDF paths, directory holding them), or ([], None) if nothing was produced.
+    """
+    parent_temp_dir = tempfile.mkdtemp(prefix="sec_pdfs_run_")
+    generated_pdf_final_paths = []
+    metrics = metrics if metrics is not None else RunMetrics(cik)
+    try:
+        cik_padded = cik.zfill(10)
+        data = fetch_submissions(cik_padded, progress, metrics=metrics)
+        prepared = prepare_filing_jobs(data, cik_padded, ticker, fiscal_year_end_month, fy_adjust, cleanup_temp_files, streaming_ingest, progress,
+                                       min_fiscal_year, start_date, end_date, slim, on_stage, cancel_event, metrics)
+        if prepared is None: return [], None
+        company_name, ticker, jobs = prepared
+        progress(f"Processing Filings for: {company_name}", level="heading")
+        limit_counter = 0 # Limit processing per run
+        jobs = iter(jobs)
+        results = run_filing_pipeline(jobs, max_workers=max_workers, max_results=max_filings)
+        try:
+            for job, pdf_path_temp in results:
+                if pdf_path_temp and os.path.exists(pdf_path_temp):
+                    with metrics.filing(job['accession']).stage('move'):
+                        final_pdf_path = move_pdf_to_dir(pdf_path_temp, parent_temp_dir, cleanup_temp_files, progress)
+                    if final_pdf_path:
+                        generated_pdf_final_paths.append(final_pdf_path)
+                        limit_counter += 1
+                if limit_counter >= max_filings: break
+                if cancel_event is not None and cancel_event.is_set(): progress("Run cancelled.", level="warning"); break
+        finally: results.close() # Cancels filings still in flight
+        if limit_counter >= max_filings and next(jobs, None) is not None: # Only if eligible filings were left unprocessed
+            progress(f"Reached processing limit ({max_filings}).", level="warning")
+    except requests.exceptions.Timeout: progress(f"Timeout fetching submission data for CIK {cik}", level="error")
+    except requests.exceptions.RequestException as e: progress(f"Network error fetching submission data: {e}", level="error")
+    except KeyError as e: progress(f"Data parsing error (KeyError): {e}.", level="error")
+    except Exception as e: progress(f"Unexpected error: {e}", level="error", exc=e)
+    finally:
+        metrics.finish(get_render_engine().peak_worker_rss_mb)
+        pdf_lookups = metrics.summary()['cache'].get('pdf') # This run's lookups only
+        if pdf_lookups:
+            progress(f"PDF cache: {pdf_lookups['hits']} hit(s), {pdf_lookups['misses']} miss(es), "
+                     f"~{pdf_lookups['saved_seconds']:.0f}s of rendering saved.", level="info")
+        if not generated_pdf_final_paths and os.path.exists(parent_temp_dir):
+             shutil.rmtree(parent_temp_dir, ignore_errors=True) # Clean up parent dir if no files were successfully processed
+    # Return list of final PDF paths and the parent directory they reside in
+    return generated_pdf_final_paths, parent_temp_dir if generated_pdf_final_paths else None
+
+def sync_filings_for_cik(cik, ticker, fiscal_year_end_month, fy_adjust, cleanup_temp_files, output_dir, manifest,
+                         max_workers=DEFAULT_PIPELINE_WORKERS, streaming_ingest=None, progress=print_progress, max_filings=MAX_FILINGS_PER_RUN,
+                         min_fiscal_year=MIN_FISCAL_YEAR, start_date=None, end_date=None, slim=None, on_stage=None, cancel_event=None,
+                         metrics=None):
+    """
+    Incremental version of `process_filings_for_cik`. Filings already recorded in `manifest`
+    (a sec_manifest.FilingManifest) with their PDF still on disk and the same options (fiscal-year
+    settings, ticker, `slim`) are reused; the rest are downloaded and rendered, into `output_dir`,
+    and then recorded. A PDF made with other options is replaced.
+    Returns (old and new PDF paths in filing order, output_dir), or ([], None) if there are none.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    selected = [] # (job, pdf_path) in filing order, old and new
+    metrics = metrics if metrics is not None else RunMetrics(cik)
+    try:
+        cik_padded = cik.zfill(10)
+        data = fetch_submissions(cik_padded, progress, metrics=metrics)
+        prepared = prepare_filing_jobs(data, cik_padded, ticker, fiscal_year_end_month, fy_adjust, cleanup_temp_files, streaming_ingest, progress,
+                                       min_fiscal_year, start_date, end_date, slim, on_stage, cancel_event, metrics)
+        if prepared is None: return [], None
+        company_name, ticker, jobs = prepared
+        progress(f"Syncing Filings for: {company_name}", level="heading")
+        options = options_fingerprint(fiscal_year_end_month=fiscal_year_end_month, fy_adjust=fy_adjust, ticker=ticker, slim=slim)
+        known = manifest.processed(cik_padded, options)
+        stale = {accession: row['pdf_path'] for accession, row in manifest.processed(cik_padded).items() if accession not in known}
+        slots = {} # accession -> position in filing order
+        jobs = iter(jobs); exhausted = False
+        def new_jobs(budget):
+            """Takes the next `budget` filings in order; reused ones go straight into `selected`, new ones are yielded."""
+            nonlocal exhausted
+            for _ in range(budget):
+                job = next(jobs, None)
+                if job is None: exhausted = True; return
+                slots[job['accession']] = len(slots)
+                if job['accession'] in known:
+                    selected.append((job, known[job['accession']]['pdf_path']))
+                    metrics.filing(job['accession'], f"{job['form']} {job['period']} ({job['date_str']})").finish("reused")
+                    if on_stage: on_stage(job['accession'], "reused", f"{job['form']} {job['period']} ({job['date_str']})")
+                else: yield job
+        # Each round takes only as many filings as there are free slots, so every new render is kept;
+        # filings that failed leave slots free for the next round.
+        while len(selected) < max_filings and not exhausted:
+            if cancel_event is not None and cancel_event.is_set(): progress("Sync cancelled.", level="warning"); break
+            results = run_filing_pipeline(new_jobs(max_filings - len(selected)), max_workers=max_workers)
+            try:
+                for job, pdf_path_temp in results:
+                    if pdf_path_temp and os.path.exists(pdf_path_temp):
+                        if job['accession'] in stale: # Made with other options; free its name for the new PDF
+                            try: os.remove(stale[job['accession']])
+                            except OSError: pass
+                        with metrics.filing(job['accession']).stage('move'):
+                            final_pdf_path = move_pdf_to_dir(pdf_path_temp, output_dir, cleanup_temp_files, progress)
+                        if final_pdf_path:
+                            manifest.record(cik_padded, job['accession'], job['form'], job['date_str'], job['period'], final_pdf_path, options)
+                            selected.append((job, final_pdf_path))
+                    if cancel_event is not None and cancel_event.is_set(): break
+            finally: results.close() # Cancels filings still in flight
+        selected.sort(key=lambda item: slots[item[0]['accession']])
+        reused = sum(1 for job, _ in selected if job['accession'] in known)
+        progress(f"{len(selected) - reused} new filing(s) processed, {reused} reused from previous runs.", level="success" if selected else "warning")
+    except requests.exceptions.Timeout: progress(f"Timeout fetching submission data for CIK {cik}", level="error")
+    except requests.exceptions.RequestException as e: progress(f"Network error fetching submission data: {e}", level="error")
+    except KeyError as e: progress(f"Data parsing error (KeyError): {e}.", level="error")
+    except Exception as e: progress(f"Unexpected error: {e}", level="error", exc=e)
+    finally: metrics.finish(get_render_engine().peak_worker_rss_mb)
+    pdf_paths = [pdf_path for _, pdf_path in selected]
+    return pdf_paths, output_dir if pdf_paths else None
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+HTML preprocessing for filings on the regular (in-memory) path.
+
+- Parser backend: lxml if installed, else html5-parser, else the pure-Python
+  'html.parser'. Set SEC_HTML_PARSER to force one ('lxml', 'html5-parser',
+  'html.parser').
+- Mojibake is repaired in one regex pass (`sec_ingest.fix_mojibake`) instead
+  of one `str.replace` scan per sequence.
+- A single traversal fixes `<meta charset>` and collects the asset references
+  that `download_assets` needs, so the tree is not walked twice.
+"""
+import importlib.util
+import os
+
+from bs4 import BeautifulSoup
+
+from sec_ingest import fix_mojibake
+
+PARSER_PREFERENCE = ('lxml', 'html5-parser', 'html.parser')
+_ASSET_TAGS = ('img', 'link', 'script')
+
+
+def available_parsers():
+    """Parser backends usable in this environment, fastest first."""
+    found = []
+    for name in PARSER_PREFERENCE:
+        module = {'lxml': 'lxml', 'html5-parser': 'html5_parser'}.get(name)
+        if module is None or importlib.util.find_spec(module) is not None: found.append(name)
+    return found
+
+def default_parser():
+    """The backend used when none is given: SEC_HTML_PARSER if set and available, else the fastest installed."""
+    forced = os.environ.get('SEC_HTML_PARSER')
+    parsers = available_parsers()
+    return forced if forced in parsers else parsers[0]
+
+
+def parse_html(text, parser=None):
+    """Parses `text` into a BeautifulSoup tree with the given (or default) backend."""
+    parser = parser or default_parser()
+    if parser == 'html5-parser':
+        import html5_parser
+        return html5_parser.parse(text, treebuilder='soup', return_root=False)
+    return BeautifulSoup(text, parser)
+
+
+def asset_url_attr(tag):
+    """Returns the attribute holding a downloadable asset URL on `tag` ('src'/'href'), or None."""
+    if tag.name in ('img', 'script') and tag.get('src'): attr = 'src'
+    elif tag.name == 'link' and tag.get('rel') == ['stylesheet'] and tag.get('href'): attr = 'href'
+    else: return None
+    return None if tag[attr].startswith('data:') else attr
+
+
+def collect_asset_refs(soup):
+    """Returns [(tag, attr, url)] for every downloadable asset in document order."""
+    refs = []
+    for tag in soup.find_all(_ASSET_TAGS):
+        attr = asset_url_attr(tag)
+        if attr: refs.append((tag, attr, tag[attr]))
+    return refs
+
+
+def preprocess_html(decoded_text, parser=None):
+    """
+    Repairs mojibake, parses the document, forces `<meta charset="UTF-8">` and collects asset
+    references in one traversal. Returns (soup, asset_refs) where asset_refs is [(tag, attr, url)].
+    """
+    soup = parse_html(fix_mojibake(decoded_text), parser)
+    meta_charset = None; refs = []
+    for tag in soup.find_all(('meta',) + _ASSET_TAGS):
+        if tag.name == 'meta':
+            if meta_charset is None and tag.has_attr('charset'): meta_charset = tag
+            continue
+        attr = asset_url_attr(tag)
+        if attr: refs.append((tag, attr, tag[attr]))
+    if meta_charset is None:
+        meta = soup.new_tag('meta', charset='UTF-8')
+        if soup.head: soup.head.insert(0, meta)
+        else: head = soup.new_tag('head'); head.append(meta); soup.insert(0, head)
+    elif meta_charset['charset'].lower() != 'utf-8': meta_charset['charset'] = 'UTF-8'
+    return soup, refs
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Process-pool PDF rendering with warm WeasyPrint workers.
+
+WeasyPrint layout is CPU-bound, so rendering in threads queues every filing
+behind the GIL. `RenderEngine` keeps a persistent pool of worker processes;
+each worker imports WeasyPrint once and keeps the compiled stylesheet and
+FontConfiguration for the rest of its life.
+
+Workers are recycled after `max_jobs_per_worker` renders, or earlier when one
+reports peak RSS above `max_worker_rss_mb`, so slow leaks in the layout engine
+cannot grow without bound. Jobs that exceed `job_timeout` have their pool torn
+down (the only way to stop a running render) and raise `RenderTimeout`.
+
+This module must stay importable without Streamlit: with the 'spawn' start
+method, workers import it fresh.
+"""
+import atexit
+import hashlib
+import importlib.metadata
+import multiprocessing
+import os
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+PDF_STYLESHEET = '''
+    @page { size: A4; margin: 1.5cm; } body { font-family: sans-serif; line-height: 1.4; word-wrap: break-word; }
+    table { border-collapse: collapse; width: 100%; margin-bottom: 1em; } th, td { border: 1px solid #ddd; padding: 4px; text-align: left; vertical-align: top; }
+    th { background-color: #f2f2f2; } img { max-width: 100%; height: auto; vertical-align: middle; }
+    h1, h2, h3, h4, h5, h6 { page-break-after: avoid; } table, figure { page-break-inside: avoid; } tr, li { page-break-inside: avoid; }
+'''
+
+DEFAULT_JOB_TIMEOUT = 600 # Seconds; large 10-Ks can take minutes
+DEFAULT_MAX_JOBS_PER_WORKER = 25
+DEFAULT_MAX_WORKER_RSS_MB = 1536
+
+
+class RenderTimeout(Exception):
+    """Raised when a render job does not finish within the engine's job timeout."""
+
+
+def weasyprint_version():
+    """Installed WeasyPrint version (read from package metadata, without importing it), or None."""
+    try: return importlib.metadata.version('weasyprint')
+    except importlib.metadata.PackageNotFoundError: return None
+
+def render_fingerprint(html_path, asset_paths=(), stylesheet=PDF_STYLESHEET):
+    """
+    Hash of everything a rendered PDF depends on: the HTML, its local assets (by file name
+    and content), the stylesheet and the WeasyPrint version. Returns None if WeasyPrint is
+    not installed.
+    """
+    version = weasyprint_version()
+    if version is None: return None
+    h = hashlib.sha256()
+    h.update(f"weasyprint={version}\0".encode()); h.update(stylesheet.encode('utf-8')); h.update(b'\0')
+    for path in [html_path] + sorted(asset_paths, key=os.path.basename):
+        h.update(os.path.basename(path).encode('utf-8')); h.update(b'\0')
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''): h.update(chunk)
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+# --- Worker side (runs inside each pool process, or in-process when workers=0) ---
+
+_warm = {} # 'HTML', 'css', 'font_config', or 'import_error'
+
+def _init_worker(stylesheet):
+    """Imports WeasyPrint and compiles the stylesheet once per worker process."""
+    try:
+        from weasyprint import HTML, CSS
+        try: from weasyprint.text.fonts import FontConfiguration # WeasyPrint >= 53
+        except ImportError: from weasyprint.fonts import FontConfiguration
+    except ImportError as e:
+        _warm['import_error'] = str(e); return
+    font_config = FontConfiguration()
+    _warm.update(HTML=HTML, font_config=font_config, css=CSS(string=stylesheet, font_config=font_config))
+
+def peak_rss_mb():
+    """Peak resident set size of the calling process in MB (0.0 where unavailable, e.g. Windows)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if os.uname().sysname == 'Darwin' else peak / 1024 # bytes on macOS, KiB on Linux
+    except (ImportError, AttributeError): return 0.0 # Windows
+
+def _render_job(html_path, pdf_path):
+    """Renders one HTML file. Returns (output size in bytes, worker peak RSS in MB)."""
+    if 'import_error' in _warm: raise ImportError(_warm['import_error'])
+    html_obj = _warm['HTML'](filename=html_path)
+    html_obj.write_pdf(pdf_path, stylesheets=[_warm['css']], font_config=_warm['font_config'])
+    size = os.path.getsize(pdf_path) if os.path.exists(pdf_path) else 0
+    return size, peak_rss_mb()
+
+
+# --- Engine (parent side) ---
+
+class RenderEngine:
+    """
+    Persistent pool of WeasyPrint worker processes.
+    `workers=0` renders in the calling process (still with a warm stylesheet), which is
+    useful where subprocesses are not allowed.
+    """
+    def __init__(self, workers=None, job_timeout=DEFAULT_JOB_TIMEOUT, max_jobs_per_worker=DEFAULT_MAX_JOBS_PER_WORKER,
+                 max_worker_rss_mb=DEFAULT_MAX_WORKER_RSS_MB, stylesheet=PDF_STYLESHEET):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.job_timeout = job_timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.max_worker_rss_mb = max_worker_rss_mb
+        self.stylesheet = stylesheet
+        self._pool = None
+        self._lock = threading.Lock()
+        self._local_lock = threading.Lock() # Serialises in-process renders (workers=0)
+        self.peak_worker_rss_mb = 0.0 # Highest peak RSS reported by a render (for metrics)
+
+    def _new_pool(self):
+        # 'spawn' gives workers a clean interpreter (no Streamlit state) and is required for max_tasks_per_child
+        kwargs = dict(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                      initializer=_init_worker, initargs=(self.stylesheet,))
+        try: return ProcessPoolExecutor(max_tasks_per_child=self.max_jobs_per_worker, **kwargs)
+        except TypeError: return ProcessPoolExecutor(**kwargs) # Python < 3.11: recycling by RSS only
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None: self._pool = self._new_pool()
+            return self._pool
+
+    def _recycle(self, pool, kill=False):
+        """Replaces `pool` with a fresh one (if it is still current). `kill` stops running jobs too."""
+        with self._lock:
+            if self._pool is not pool: return # Someone else already recycled it
+            self._pool = None
+        if kill:
+            # ProcessPoolExecutor has no public way to stop a running job
+            for proc in list(getattr(pool, '_processes', {}).values()):
+                try: proc.terminate()
+                except Exception: pass
+        pool.shutdown(wait=False, cancel_futures=kill) # A graceful recycle lets queued jobs finish
+
+    def render(self, html_path, pdf_path):
+        """Renders `html_path` to `pdf_path`. Returns the PDF size in bytes (0 if nothing was written)."""
+        if self.workers <= 0:
+            with self._local_lock:
+                if not _warm: _init_worker(self.stylesheet)
+                size, worker_rss_mb = _render_job(html_path, pdf_path)
+                self.peak_worker_rss_mb = max(self.peak_worker_rss_mb, worker_rss_mb)
+                return size
+        for attempt in (1, 2):
+            pool = self._get_pool()
+            try: future = pool.submit(_render_job, html_path, pdf_path)
+            except RuntimeError: continue # Pool was shut down between _get_pool and submit
+            try:
+                size, worker_rss_mb = future.result(timeout=self.job_timeout)
+            except FutureTimeoutError:
+                self._recycle(pool, kill=True)
+                raise RenderTimeout(f"Rendering {os.path.basename(html_path)} exceeded {self.job_timeout}s")
+            except (BrokenProcessPool, CancelledError):
+                # Pool died or was killed under us (e.g. another job timed out): retry once on a fresh pool
+                self._recycle(pool)
+                if attempt == 2: raise
+                continue
+            self.peak_worker_rss_mb = max(self.peak_worker_rss_mb, worker_rss_mb)
+            if self.max_worker_rss_mb and worker_rss_mb > self.max_worker_rss_mb: self._recycle(pool)
+            return size
+        raise BrokenProcessPool("Render pool unavailable")
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None: pool.shutdown(wait=True, cancel_futures=True)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_render_engine():
+    """Returns the process-wide RenderEngine, creating it on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = RenderEngine()
+            atexit.register(_engine.shutdown)
+        return _engine
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar selection of 10-K/10-Q filings from submissions data.
+
+data.sec.gov returns filings as parallel arrays (form, filingDate, ...), in
+`filings['recent']` for the latest ~1000 filings and in paginated history
+files (`filings['files']`) for older ones. Each page is filtered as whole
+columns: form, date range and fiscal-year cutoff are boolean masks and the
+period labels (FY23, 1Q24, ...) come from one arithmetic pass over the
+filing years and months. NumPy is used when installed (imported on the first
+selection, so importing this module stays cheap); otherwise the same
+arithmetic runs row by row.
+
+History pages are fetched lazily: only once the rows from newer pages have
+been consumed, and only if the page's date span can contain filings in the
+requested range.
+"""
+from datetime import datetime
+
+import requests
+
+FILING_FORMS = ('10-K', '10-Q')
+MIN_FISCAL_YEAR = 2017 # Filings labelled with an earlier fiscal year are skipped
+REQUIRED_COLUMNS = ('form', 'filingDate', 'accessionNumber', 'primaryDocument')
+_MAX_LISTED = 5 # Dates listed in an aggregated warning
+
+
+def _no_progress(message, level="info", exc=None): pass
+
+def _iso(day):
+    """'YYYY-MM-DD' for a date/datetime or an ISO string, None for None."""
+    if day is None or isinstance(day, str): return day
+    return day.strftime('%Y-%m-%d')
+
+def _listed(values):
+    values = list(values)
+    more = f", ... (+{len(values) - _MAX_LISTED})" if len(values) > _MAX_LISTED else ""
+    return ', '.join(values[:_MAX_LISTED]) + more
+
+
+def fiscal_periods(is_10q, years, months, fiscal_year_end_month, fy_adjust):
+    """
+    Fiscal (quarter, year) for filings with the given filing years and months, using the
+    rules of `sec_pipeline.get_filing_period`. Works element-wise on NumPy integer arrays
+    as well as on plain ints. Quarter 0 marks a 10-K; quarter 4 is a 10-Q filed in the
+    fourth fiscal quarter (labelled FY, with a warning).
+    """
+    reported = years - (months <= fiscal_year_end_month) - (fy_adjust == "Previous Year")
+    if fiscal_year_end_month == 12:
+        quarter = ((months - 1) // 3 + 2) % 4 + 1; year = reported + (months >= 7)
+    elif fiscal_year_end_month == 3:
+        quarter = ((months - 1) // 3 + 2) % 4 + 1; year = reported + 1 - ((months >= 4) & (months <= 6))
+    else:
+        quarter = (months - fiscal_year_end_month - 1) % 12 // 3 + 1; year = reported + (months > fiscal_year_end_month)
+    return quarter * is_10q, reported + is_10q * (year - reported)
+
+
+def _parse_date(text):
+    try: return datetime.strptime(text, "%Y-%m-%d").date()
+    except (TypeError, ValueError): return None
+
+
+def _select_numpy(np, columns, n, fiscal_year_end_month, fy_adjust, start_date, end_date):
+    """NumPy engine (`np` is the numpy module). Returns (rows, date strings, invalid date strings, quarters, fiscal years)."""
+    forms = np.asarray(columns['form'][:n], dtype=str)
+    rows = np.flatnonzero(np.isin(forms, FILING_FORMS))
+    date_strs = np.asarray(columns['filingDate'][:n], dtype=str)[rows]
+    try: dates = date_strs.astype('datetime64[D]')
+    except ValueError: # Malformed entries: parse them one by one, NaT marks the bad ones
+        dates = np.array([_parse_date(s) or 'NaT' for s in date_strs], dtype='datetime64[D]')
+    invalid = np.isnat(dates)
+    keep = ~invalid
+    if start_date: keep &= dates >= np.datetime64(start_date, 'D')
+    if end_date: keep &= dates <= np.datetime64(end_date, 'D')
+    invalid_dates = date_strs[invalid].tolist()
+    rows, dates, date_strs = rows[keep], dates[keep], date_strs[keep]
+    years = dates.astype('datetime64[Y]').astype(int) + 1970
+    months = dates.astype('datetime64[M]').astype(int) % 12 + 1
+    is_10q = (forms[rows] == '10-Q').astype(int)
+    quarters, fiscal_years = fiscal_periods(is_10q, years, months, fiscal_year_end_month, fy_adjust)
+    return rows, date_strs, invalid_dates, quarters, fiscal_years
+
+
+def _select_python(columns, n, fiscal_year_end_month, fy_adjust, start_date, end_date):
+    """Fallback engine without NumPy, same results as `_select_numpy` as plain lists."""
+    rows, date_strs, invalid_dates, quarters, fiscal_years = [], [], [], [], []
+    for row, (form, date_str) in enumerate(zip(columns['form'][:n], columns['filingDate'][:n])):
+        if form not in FILING_FORMS: continue
+        day = _parse_date(date_str)
+        if day is None: invalid_dates.append(str(date_str)); continue
+        if (start_date and date_str < start_date) or (end_date and date_str > end_date): continue
+        quarter, fiscal_year = fiscal_periods(int(form == '10-Q'), day.year, day.month, fiscal_year_end_month, fy_adjust)
+        rows.append(row); date_strs.append(date_str); quarters.append(quarter); fiscal_years.append(fiscal_year)
+    return rows, date_strs, invalid_dates, quarters, fiscal_years
+
+
+def select_filings(columns, fiscal_year_end_month, fy_adjust, min_fiscal_year=MIN_FISCAL_YEAR,
+                   start_date=None, end_date=None, progress=_no_progress):
+    """
+    Selects the 10-K/10-Q rows of one page of submissions columns (`filings['recent']` or a
+    history file). `start_date`/`end_date` bound the filing date (inclusive, date or
+    'YYYY-MM-DD'); filings whose fiscal year is before `min_fiscal_year` are skipped (None = no cutoff).
+    Returns [(form, filing date, accession without dashes, period label, primary document)] in page order.
+    """
+    n = min(len(columns[key]) for key in REQUIRED_COLUMNS) # Rows missing from any column are ignored
+    start_date, end_date = _iso(start_date), _iso(end_date)
+    try: import numpy as np # Deferred: adds ~90 ms to every import of sec_pipeline otherwise
+    except ImportError: np = None # Optional: pure-Python fallback
+    if np is not None: picked = _select_numpy(np, columns, n, fiscal_year_end_month, fy_adjust, start_date, end_date)
+    else: picked = _select_python(columns, n, fiscal_year_end_month, fy_adjust, start_date, end_date)
+    rows, date_strs, invalid_dates, quarters, fiscal_years = picked
+    if invalid_dates: progress(f"Skipping {len(invalid_dates)} filing(s) with invalid dates: {_listed(invalid_dates)}", level="warning")
+    if len(rows) == 0: return []
+
+    if np is not None:
+        q4 = quarters == 4
+        if q4.any(): progress(f"Calculated Q4 for {int(q4.sum())} 10-Q filing(s) ({_listed(date_strs[q4].tolist())}). Using FY labels.", level="warning")
+        prefixes = np.where((quarters == 0) | q4, 'FY', np.char.add(quarters.astype(str), 'Q'))
+        labels = np.char.add(prefixes, np.char.zfill((fiscal_years % 100).astype(str), 2))
+        keep = fiscal_years >= min_fiscal_year if min_fiscal_year else np.ones(len(rows), dtype=bool)
+        skipped = int(len(rows) - keep.sum())
+        rows, date_strs, labels = rows[keep].tolist(), date_strs[keep].tolist(), labels[keep].tolist()
+    else:
+        q4_dates = [d for d, q in zip(date_strs, quarters) if q == 4]
+        if q4_dates: progress(f"Calculated Q4 for {len(q4_dates)} 10-Q filing(s) ({_listed(q4_dates)}). Using FY labels.", level="warning")
+        labels = [f"FY{y % 100:02d}" if q in (0, 4) else f"{q}Q{y % 100:02d}" for q, y in zip(quarters, fiscal_years)]
+        keep = [not min_fiscal_year or y >= min_fiscal_year for y in fiscal_years]
+        skipped = keep.count(False)
+        rows, date_strs, labels = ([v for v, k in zip(values, keep) if k] for values in (rows, date_strs, labels))
+    if skipped: progress(f"Skipping {skipped} filing(s) older than FY{min_fiscal_year % 100:02d}.", level="info")
+
+    selected = []
+    forms, accessions, documents = columns['form'], columns['accessionNumber'], columns['primaryDocument']
+    for row, date_str, label in zip(rows, date_strs, labels):
+        accession = accessions[row].replace('-', ''); doc_file = documents[row]
+        if not doc_file or '..' in doc_file or '/' in doc_file or '\\' in doc_file:
+            progress(f"Invalid doc name '{doc_file}' for {accession}.", level="warning"); continue
+        selected.append((forms[row], date_str, accession, label, doc_file))
+    return selected
+
+
+def history_page_needed(page, min_fiscal_year=MIN_FISCAL_YEAR, start_date=None, end_date=None):
+    """
+    Whether a `filings['files']` entry ({name, filingFrom, filingTo, ...}) can hold filings in range.
+    A filing's fiscal year is at most its calendar year + 1, so pages that end before
+    January of `min_fiscal_year - 1` can't contain anything past the cutoff.
+    """
+    earliest = max(filter(None, (_iso(start_date), f"{min_fiscal_year - 1:04d}-01-01" if min_fiscal_year else None)), default=None)
+    if earliest and page.get('filingTo') and page['filingTo'] < earliest: return False
+    if end_date and page.get('filingFrom') and page['filingFrom'] > _iso(end_date): return False
+    return True
+
+
+def iter_selected_filings(data, fetch_page, fiscal_year_end_month, fy_adjust, min_fiscal_year=MIN_FISCAL_YEAR,
+                          start_date=None, end_date=None, progress=_no_progress):
+    """
+    Yields `select_filings` tuples for a whole submissions document, newest first: first the
+    `recent` columns, then each needed history page. `fetch_page(name)` returns a page's
+    columns; it is only called when the consumer iterates past the rows already selected.
+    A page that can't be fetched ends the history with a warning.
+    """
+    yield from select_filings(data['filings']['recent'], fiscal_year_end_month, fy_adjust, min_fiscal_year, start_date, end_date, progress)
+    for page in data['filings'].get('files', []):
+        if not history_page_needed(page, min_fiscal_year, start_date, end_date): continue
+        try: columns = fetch_page(page['name'])
+        except requests.exceptions.RequestException as e:
+            progress(f"Could not fetch filing history page {page['name']}: {e}", level="warning"); return
+        if not all(key in columns for key in REQUIRED_COLUMNS):
+            progress(f"Filing history page {page['name']} is missing expected keys.", level="warning"); continue
+        yield from select_filings(columns, fiscal_year_end_month, fy_adjust, min_fiscal_year, start_date, end_date, progress)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Optional render-slimming pass between asset download and PDF rendering.
+
+Inline-XBRL filings carry a lot that WeasyPrint lays out but never shows:
+
+1. `ix:header` / `ix:hidden` blocks and other `display:none` elements are
+   removed in one streaming pass over the render-ready HTML (same chunked
+   reader as sec_ingest, so huge filings stay out of memory).
+2. Images above `max_image_pixels` are downsampled in place (needs Pillow;
+   skipped without it). Page width caps images anyway, so this only removes
+   decoding and compositing work.
+3. With `sections`, only those Items (e.g. "1A", "7", "8") are kept. This
+   needs a parsed tree, so it costs one parse of the already slimmed file.
+
+`slim_filing` returns a report of the bytes removed; the pipeline combines it
+with the measured render time to estimate the rendering time saved.
+"""
+import os
+import re
+import tempfile
+import time
+
+from sec_ingest import _iter_segments, _iter_text
+
+DEFAULT_MAX_IMAGE_PIXELS = 4_000_000 # ~2500x1600; larger images are downsampled to this budget
+JPEG_QUALITY = 85
+
+_ANY_TAG_RE = re.compile(r'''<(/?)([A-Za-z][\w:.-]*)((?:[^>"']|"[^"]*"|'[^']*')*)>''')
+_DISPLAY_NONE_RE = re.compile(r'''\bstyle\s*=\s*(?:"[^"]*display\s*:\s*none[^"]*"|'[^']*display\s*:\s*none[^']*')''', re.IGNORECASE)
+_HIDDEN_TAGS = ('ix:header', 'ix:hidden')
+_VOID_TAGS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'))
+# Elements whose end tag may be omitted: a hidden one could swallow the rest of the document, so they are left alone
+_OPTIONAL_END_TAGS = frozenset(('p', 'li', 'dt', 'dd', 'tr', 'td', 'th', 'tbody', 'thead', 'tfoot', 'option', 'optgroup', 'colgroup', 'caption', 'rt', 'rp'))
+
+ITEM_HEADING_RE = re.compile(r'^\s*item\s*(\d{1,2}[a-d]?)\s*[.:\-–—\s]', re.IGNORECASE)
+_HEADING_BLOCKS = ('p', 'div', 'td', 'th', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+_MAX_HEADING_CHARS = 300 # Longer blocks starting with "Item 7" are prose, not headings
+
+
+def strip_hidden(src_path, out_path):
+    """
+    Copies the UTF-8 HTML at `src_path` to `out_path` without `ix:header`/`ix:hidden` elements
+    and elements styled `display:none` (including their content). Returns bytes written.
+    """
+    skip_name = None; depth = 0 # Element being dropped and its nesting depth
+    written = 0
+    with open(out_path, 'w', encoding='utf-8') as out:
+        for segment in _iter_segments(_iter_text(src_path, 'utf-8')):
+            parts = []; pos = 0
+            for m in _ANY_TAG_RE.finditer(segment):
+                closing = m.group(1) == '/'; name = m.group(2).lower(); attrs = m.group(3)
+                self_closing = name in _VOID_TAGS or attrs.rstrip().endswith('/')
+                if skip_name is None:
+                    if closing or not (name in _HIDDEN_TAGS or (name not in _OPTIONAL_END_TAGS and _DISPLAY_NONE_RE.search(attrs))): continue
+                    parts.append(segment[pos:m.start()]); pos = m.end()
+                    if not self_closing: skip_name, depth = name, 1
+                elif closing and name in ('body', 'html'): # Unclosed hidden element: never drop past the document end
+                    skip_name = None; pos = m.start()
+                elif name == skip_name and not self_closing:
+                    depth += -1 if closing else 1
+                    if depth == 0: skip_name = None; pos = m.end()
+            if skip_name is None: parts.append(segment[pos:])
+            written += out.write(''.join(parts))
+    return written
+
+
+def downsample_images(asset_paths, max_pixels=DEFAULT_MAX_IMAGE_PIXELS):
+    """
+    Shrinks raster images with more than `max_pixels` pixels to fit the budget, in place and in
+    their original format. Returns (images downsampled, bytes saved); (0, 0) without Pillow.
+    """
+    try: from PIL import Image
+    except ImportError: return 0, 0
+    count = saved = 0
+    for path in asset_paths:
+        try:
+            with Image.open(path) as img:
+                width, height = img.size
+                if width * height <= max_pixels or getattr(img, 'is_animated', False): continue
+                scale = (max_pixels / (width * height)) ** 0.5
+                image_format = img.format
+                img.thumbnail((max(1, int(width * scale)), max(1, int(height * scale))), Image.LANCZOS)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.slim_')
+                with os.fdopen(fd, 'wb') as f: img.save(f, format=image_format, **({'quality': JPEG_QUALITY} if image_format == 'JPEG' else {}))
+            size_before = os.path.getsize(path)
+            os.replace(tmp_path, path)
+            count += 1; saved += size_before - os.path.getsize(path)
+        except Exception: # Not an image Pillow can read/write (CSS, SVG, decompression bomb, ...): leave it
+            continue
+    return count, saved
+
+
+def _heading_item(tag):
+    """The Item number ("7", "1A") if `tag` is a heading block like "Item 7. Management's Discussion...", else None."""
+    text = tag.get_text(" ", strip=True)
+    if len(text) > _MAX_HEADING_CHARS: return None
+    m = ITEM_HEADING_RE.match(text + " ")
+    return m.group(1).upper() if m else None
+
+
+def select_sections(soup, sections):
+    """
+    Keeps only the content of the given Items (e.g. ["1A", "7", "8"]) in `soup`, in place.
+    Content belongs to the last Item heading before it in document order; anything before
+    the first heading (cover page) is dropped, table-of-contents rows of selected Items stay.
+    Returns the Item numbers found, or [] (document left untouched) if there are no headings.
+    """
+    selected = {section.strip().upper() for section in sections}
+    headings = {}; blocks = [] # id(block) -> Item number; the heading blocks
+    for string in soup.find_all(string=ITEM_HEADING_RE):
+        block = string.find_parent(_HEADING_BLOCKS)
+        if block is not None and id(block) not in headings:
+            item = _heading_item(block)
+            if item: headings[id(block)] = item; blocks.append(block)
+    if not headings: return []
+    on_path = {id(parent) for block in blocks for parent in block.parents} # Ancestors to descend into
+
+    def walk(container, current):
+        """Drops children of `container` outside the selected Items; returns the Item in effect after it."""
+        for child in list(container.children):
+            if id(child) in headings:
+                current = headings[id(child)]
+                if current not in selected: child.extract()
+            elif id(child) in on_path: current = walk(child, current)
+            elif current not in selected: child.extract()
+        return current
+    walk(soup.body or soup, None)
+    return sorted(set(headings.values()), key=lambda item: (int(re.match(r'\d+', item).group(0)), item))
+
+
+def slim_filing(html_path, asset_paths=(), strip=True, max_image_pixels=DEFAULT_MAX_IMAGE_PIXELS, sections=None):
+    """
+    Slims the render-ready HTML at `html_path` (rewritten in place) and its local assets.
+    `strip` removes hidden inline-XBRL content, `max_image_pixels` (None = off) bounds image
+    size and `sections` keeps only those Items. Returns a report dict: html_bytes_before,
+    html_bytes_after, images_downsampled, image_bytes_saved, sections_found (None if not
+    requested) and seconds spent.
+    """
+    start = time.monotonic()
+    report = dict(html_bytes_before=os.path.getsize(html_path), images_downsampled=0, image_bytes_saved=0, sections_found=None)
+    directory = os.path.dirname(html_path)
+    if strip:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.slim_', suffix='.html'); os.close(fd)
+        try:
+            strip_hidden(html_path, tmp_path)
+            os.replace(tmp_path, html_path)
+        finally:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+    if sections:
+        from sec_preprocess import parse_html # Imported on first use: pulls in BeautifulSoup/lxml
+        with open(html_path, encoding='utf-8') as f: soup = parse_html(f.read())
+        report['sections_found'] = select_sections(soup, sections)
+        if report['sections_found']:
+            with open(html_path, 'w', encoding='utf-8') as f: f.write(str(soup))
+        del soup
+    if max_image_pixels:
+        report['images_downsampled'], report['image_bytes_saved'] = downsample_images(asset_paths, max_image_pixels)
+    report['html_bytes_after'] = os.path.getsize(html_path)
+    report['seconds'] = time.monotonic() - start
+    return report
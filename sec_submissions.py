@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Revalidating cache for data.sec.gov submissions documents.
+
+Submissions JSON for large filers is several megabytes, but changes at most a
+few times a day. Entries younger than `ttl` seconds are served without any
+network traffic. Older entries are revalidated with If-None-Match /
+If-Modified-Since, and a 304 only refreshes the timestamp. Only the fields
+the pipeline reads are kept (see `compact_submissions`), written to disk as
+compact JSON and held parsed in memory, so polling many companies costs
+almost no bandwidth or parse time when nothing changed.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import warnings
+
+import requests
+
+from sec_cache import DEFAULT_CACHE_DIR
+
+SUBMISSIONS_BASE_URL = os.environ.get('SEC_SUBMISSIONS_BASE_URL', "https://data.sec.gov/submissions/") # Overridable for offline benchmarks
+DEFAULT_SUBMISSIONS_TTL = int(os.environ.get('SEC_SUBMISSIONS_TTL', 3600)) # Seconds an entry is used without revalidating
+
+# Fields kept from each submissions document; everything else is dropped before caching
+_TOP_LEVEL_FIELDS = ('cik', 'name', 'tickers', 'fiscalYearEnd')
+_FILING_COLUMNS = ('accessionNumber', 'filingDate', 'reportDate', 'form', 'primaryDocument')
+
+
+def compact_submissions(data):
+    """
+    Returns a copy of a submissions document (main CIK##########.json or a paginated
+    CIK##########-submissions-###.json) with only the fields the pipeline uses.
+    """
+    if 'filings' not in data: # History page: the columns sit at the top level
+        return {key: data[key] for key in _FILING_COLUMNS if key in data}
+    compact = {key: data[key] for key in _TOP_LEVEL_FIELDS if key in data}
+    filings = data['filings']
+    compact['filings'] = {'recent': {key: filings['recent'][key] for key in _FILING_COLUMNS if key in filings.get('recent', {})},
+                          'files': filings.get('files', [])}
+    if 'recent' not in filings: del compact['filings']['recent']
+    return compact
+
+
+class SubmissionsCache:
+    """Disk + memory cache of compacted submissions documents, revalidated with conditional GETs."""
+    def __init__(self, root=os.path.join(DEFAULT_CACHE_DIR, 'submissions'), ttl=DEFAULT_SUBMISSIONS_TTL):
+        self.root = root
+        self.ttl = ttl
+        os.makedirs(root, exist_ok=True)
+        self._memory = {} # name -> entry dict (meta fields + 'data')
+        self._lock = threading.Lock()
+        self.hits = 0; self.revalidated = 0; self.downloads = 0
+
+    def _path(self, name):
+        return os.path.join(self.root, os.path.basename(name))
+
+    def _load(self, name):
+        with self._lock:
+            entry = self._memory.get(name)
+        if entry is not None: return entry
+        try:
+            with open(self._path(name), encoding='utf-8') as f: entry = json.load(f)
+        except (OSError, ValueError): return None
+        with self._lock: self._memory[name] = entry
+        return entry
+
+    def _store(self, name, entry):
+        with self._lock: self._memory[name] = entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.incoming_')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f: json.dump(entry, f, separators=(',', ':'))
+            os.replace(tmp_path, self._path(name))
+        except OSError:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+
+    def get(self, name, fetch, progress=None):
+        """
+        Returns the compacted document `name` (e.g. "CIK0000320193.json").
+        `fetch(extra_headers)` performs the GET for it and returns the response. A stale entry
+        is served (with a warning) if revalidation fails with a network error.
+        """
+        entry = self._load(name)
+        now = time.time()
+        if entry is not None and now - entry['fetched_at'] < self.ttl:
+            with self._lock: self.hits += 1
+            return entry['data']
+        conditional = {}
+        if entry is not None:
+            if entry.get('etag'): conditional['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'): conditional['If-Modified-Since'] = entry['last_modified']
+        try:
+            response = fetch(conditional)
+            if response.status_code == 304 and entry is not None:
+                entry = dict(entry, fetched_at=now)
+                self._store(name, entry)
+                with self._lock: self.revalidated += 1
+                return entry['data']
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            if entry is None: raise
+            if progress: progress(f"Using cached {name} (revalidation failed: {e})", level="warning")
+            return entry['data']
+        data = compact_submissions(response.json())
+        self._store(name, {'fetched_at': now, 'etag': response.headers.get('ETag'),
+                           'last_modified': response.headers.get('Last-Modified'), 'data': data})
+        with self._lock: self.downloads += 1
+        return data
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_submissions_cache():
+    """Returns the process-wide SubmissionsCache, or None if its directory can't be used."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try: _cache = SubmissionsCache()
+            except OSError as e:
+                warnings.warn(f"Submissions cache disabled: {e}", RuntimeWarning, stacklevel=2); return None
+        return _cache
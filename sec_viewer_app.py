@@ -1,26 +1,24 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
-import requests
 import os
-import tempfile
-import shutil
 # Removed: from threading import Thread - No longer needed for main logic
-from bs4 import BeautifulSoup # Requires 'beautifulsoup4' in requirements.txt
-from urllib.parse import urlparse, urljoin
 import subprocess
 from datetime import datetime
 import platform # Added for platform check in chrome path getter
-import zipfile # Added for zip functionality
-import io      # Added for zip functionality (BytesIO)
+import time
+# Fetch/process/render logic lives in sec_pipeline (importable without Streamlit); sec_jobs runs it off the script thread
+from sec_pipeline import DEFAULT_PIPELINE_WORKERS
+from sec_jobs import get_job_runner # Background jobs: survive reruns, shared by identical requests
+from sec_bundle import deferred_file, get_or_build_zip # Disk-backed ZIP and lazy downloads
+from sec_ingest import STREAMING_INGEST_THRESHOLD_BYTES # Low-memory path for huge filings
+from sec_metrics import serve_metrics # Prometheus-style /metrics endpoint (optional, SEC_METRICS_PORT)
+
+METRICS_PORT = os.environ.get('SEC_METRICS_PORT') # If set, /metrics is served on this port
+METRICS_HOST = os.environ.get('SEC_METRICS_HOST', '127.0.0.1') # Interface for /metrics (0.0.0.0 = every interface)
+SECTION_CHOICES = ["1", "1A", "1B", "2", "3", "4", "5", "6", "7", "7A", "8", "9", "9A", "9B", "10", "11", "12", "13", "14", "15"]
 
 # --- Configuration ---
 
-# Use a more descriptive User-Agent
-HEADERS = {
-    # IMPORTANT: Replace with your actual contact info/app name if deploying publicly
-    'User-Agent': 'Streamlit SEC Filing Viewer App (sec-viewer-contact@example.com)'
-}
-
 # Paths for Chrome (Server-Side ONLY, if using the Chrome method)
 # Ensure Chrome is installed on the server if you uncomment and use this.
 CHROME_PATH_SERVER = {
@@ -35,9 +33,10 @@ CHROME_PATH_SERVER = {
 # potentially due to internal threading in libraries like WeasyPrint or its
 # dependencies. If the app functions correctly, this warning can often be ignored.
 _status_area = None
-def setup_status_area():
-    """Initializes the container used for status messages."""
+def setup_status_area(container=None):
+    """Initializes the container used for status messages (`container`, or the session's status container)."""
     global _status_area
+    if container is not None: _status_area = container; return
     # Ensure session state holds the container, create if needed
     if 'status_container' not in st.session_state:
         st.session_state.status_container = st.container()
@@ -58,236 +57,97 @@ def update_status(message, level="info"):
     else: # Fallback if container somehow not set up (shouldn't happen with current logic)
         print(f"STATUS ({level}): {message}") # Log to console as fallback
 
-def get_filing_period(form, filing_date, fiscal_year_end_month, fy_adjust):
+STAGE_ICONS = {'queued': '⏳', 'fetching': '⬇️', 'rendering': '🖨️', 'done': '✅', 'reused': '♻️', 'failed': '❌', 'cancelled': '⏹️'}
+MAX_SHOWN_MESSAGES = 40 # Most recent job messages shown in the status area
+
+@st.cache_resource
+def start_metrics_endpoint(port, host=METRICS_HOST):
+    """Starts the Prometheus metrics endpoint once per server process. Returns (its URL, None) or (None, error message)."""
+    try: serve_metrics(port, host=host)
+    except OSError as e: return None, f"Metrics endpoint disabled: {e}"
+    return f"http://{host}:{port}/metrics", None
+
+def show_metrics(metrics):
+    """Collapsible panel with a job's per-stage timings, bytes, cache hits and peak RSS (sec_metrics.RunMetrics)."""
+    summary = metrics.summary()
+    with st.expander("Metrics", expanded=False):
+        downloaded = sum(count for kind, count in summary['bytes'].items() if kind != 'pdf')
+        hits = sum(cache['hits'] for cache in summary['cache'].values()); lookups = hits + sum(cache['misses'] for cache in summary['cache'].values())
+        worker_rss = summary['render_worker_peak_rss_mb']
+        cols = st.columns(4)
+        cols[0].metric("Filings / min", f"{summary['filings_per_minute']:.1f}")
+        cols[1].metric("Downloaded", f"{downloaded / 1e6:.1f} MB")
+        cols[2].metric("Cache hits", f"{hits} / {lookups}")
+        cols[3].metric("Peak RSS", f"{summary['peak_rss_mb']:.0f} MB", help=f"Render workers: {worker_rss:.0f} MB" if worker_rss else None)
+        if summary['stages']:
+            st.markdown("**Stages** (seconds)")
+            st.dataframe([dict(stage=name, count=stats['count'], total=round(stats['total'], 3), p50=round(stats['p50'], 3),
+                               p95=round(stats['p95'], 3), max=round(stats['max'], 3)) for name, stats in summary['stages'].items()], hide_index=True)
+        records = metrics.filing_records()
+        if records:
+            st.markdown("**Filings** (seconds per stage)")
+            st.dataframe([dict(filing=record['label'] or record['accession'], outcome=record['outcome'], assets=record['asset_count'],
+                               downloaded_kb=round(sum(count for kind, count in record['bytes'].items() if kind != 'pdf') / 1024),
+                               # Suffixed so stage names (e.g. 'filing', 'assets') can't collide with the fixed columns
+                               **{f"{name} s": round(seconds, 3) for name, seconds in record['stages'].items()}) for record in records], hide_index=True)
+        st.download_button("Download metrics (JSON lines)", metrics.json_lines(), file_name=f"sec_metrics_{summary['run_id']}.jsonl",
+                           mime="application/x-ndjson", key="dl_metrics")
+        metrics_url = start_metrics_endpoint(int(METRICS_PORT))[0] if METRICS_PORT else None
+        if metrics_url: st.caption(f"Prometheus metrics for this server: {metrics_url}")
+
+def remember_job_result(snapshot):
+    """Stores a finished job's PDFs as the session's last run, so downloads survive reruns."""
+    st.session_state.last_run_job = snapshot['id']
+    generated_files, pdf_parent_dir = snapshot['result']
+    if not generated_files or not pdf_parent_dir: st.session_state.pop('last_run', None); return
+    params = snapshot['params']
+    zip_base_name = params['ticker'] or params['cik']
+    job = get_job_runner().get(snapshot['id'])
+    st.session_state.last_run = {
+        'files': generated_files, 'pdf_parent_dir': pdf_parent_dir, 'job_id': snapshot['id'],
+        # Don't leave a ZIP per run in the persistent library folder: use the job's scratch dir, removed with the job
+        'zip_dir': job.scratch_dir() if params['incremental'] and job is not None else pdf_parent_dir,
+        'zip_filename': f"{zip_base_name}_SEC_Filings_{datetime.now().strftime('%Y%m%d_%H%M')}.zip",
+    }
+
+def show_job(job_id):
     """
-    Determines the filing period label (e.g., FY23, 1Q24).
-    (Copied logic from original, ensure it matches requirements)
+    Renders a background job's filings, stages and status messages. While the job is active
+    this runs as an auto-refreshing fragment; when it finishes, the whole app reruns once
+    to show the downloads.
     """
-    reported_year = filing_date.year if filing_date.month > fiscal_year_end_month else filing_date.year - 1
-    filing_month = filing_date.month
-
-    if fy_adjust == "Previous Year":
-        reported_year -= 1
-
-    if form == "10-K":
-        return f"FY{reported_year % 100:02d}"
-    elif form == "10-Q":
-        # Logic to determine quarter based on filing month relative to FY end
-        if fiscal_year_end_month == 12: # Calendar Year End
-             if 1 <= filing_month <= 3: quarter, year = 3, reported_year  # Filed in Q1 -> Reports Q3 of Prev FY cycle
-             elif 4 <= filing_month <= 6: quarter, year = 4, reported_year  # Filed in Q2 -> Reports Q4/FY of Prev FY cycle (unlikely for 10-Q, more like 10-K)
-             elif 7 <= filing_month <= 9: quarter, year = 1, reported_year + 1 # Filed in Q3 -> Reports Q1 of Current FY cycle
-             elif 10 <= filing_month <= 12: quarter, year = 2, reported_year + 1 # Filed in Q4 -> Reports Q2 of Current FY cycle
-             else: quarter, year = 0, 0 # Should not happen
-        elif fiscal_year_end_month == 3: # March Year End
-            if 4 <= filing_month <= 6: quarter, year = 4, reported_year # Filed Apr-Jun -> Reports Q4/FY of Prev FY cycle
-            elif 7 <= filing_month <= 9: quarter, year = 1, reported_year + 1 # Filed Jul-Sep -> Reports Q1 of Current FY cycle
-            elif 10 <= filing_month <= 12: quarter, year = 2, reported_year + 1 # Filed Oct-Dec -> Reports Q2 of Current FY cycle
-            elif 1 <= filing_month <= 3: quarter, year = 3, reported_year + 1 # Filed Jan-Mar -> Reports Q3 of Current FY cycle
-            else: quarter, year = 0, 0 # Should not happen
-        else:
-             # Generic logic attempt (may need refinement for specific FY ends)
-             months_past_fy_end = (filing_date.month - fiscal_year_end_month - 1 + 12) % 12
-             quarter = (months_past_fy_end // 3) + 1
-             year = reported_year
-             if filing_date.month > fiscal_year_end_month:
-                  year += 1
-
-        if quarter == 4:
-             update_status(f"Warning: Calculated Q4 for a 10-Q filing ({filing_date.strftime('%Y-%m-%d')}). Using FY label.", level="warning")
-             return f"FY{year % 100:02d}"
-        elif quarter > 0:
-             return f"{quarter}Q{year % 100:02d}"
-        else:
-            update_status(f"Error calculating period for 10-Q filed {filing_date.strftime('%Y-%m-%d')}, FYEnd: {fiscal_year_end_month}", level="error")
-            return f"ERR{reported_year % 100:02d}"
-    else:
-        return f"Form{form}-{reported_year % 100:02d}"
-
-
-def download_assets(soup, base_doc_url, temp_dir):
-    """Downloads assets (images, css) linked in the HTML to a temporary directory."""
-    downloaded_assets_paths = []
-    for tag in soup.find_all(['img', 'link', 'script']):
-        url_attr = None
-        asset_rel_url = None
-
-        if tag.name in ['img', 'script'] and tag.get('src'):
-            url_attr = 'src'
-            asset_rel_url = tag['src']
-        elif tag.name == 'link' and tag.get('rel') == ['stylesheet'] and tag.get('href'):
-            url_attr = 'href'
-            asset_rel_url = tag['href']
-
-        if not url_attr or not asset_rel_url or asset_rel_url.startswith('data:'):
-            continue
-
-        absolute_url = urljoin(base_doc_url, asset_rel_url)
-        try:
-            response = requests.get(absolute_url, headers=HEADERS, stream=True, timeout=20)
-            response.raise_for_status()
-            parsed_url = urlparse(absolute_url)
-            filename = os.path.basename(parsed_url.path)
-            if not filename:
-                content_type = response.headers.get('content-type', '').split(';')[0]
-                ext = '.css' if 'css' in content_type else '.jpg' if 'jpeg' in content_type else '.png' if 'png' in content_type else '.js' if 'javascript' in content_type else '.asset'
-                filename = f"asset_{len(downloaded_assets_paths) + 1}{ext}"
-            filename = "".join(c for c in filename if c.isalnum() or c in ('-', '_', '.'))[:100]
-            local_path = os.path.join(temp_dir, filename)
-            with open(local_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192): f.write(chunk)
-            tag[url_attr] = filename
-            downloaded_assets_paths.append(local_path)
-        except requests.exceptions.Timeout:
-             update_status(f"Timeout downloading asset {asset_rel_url}", level="warning")
-        except requests.exceptions.RequestException as e:
-            update_status(f"Failed to download asset {asset_rel_url}: {e}", level="warning")
-        except Exception as e:
-            update_status(f"Error processing asset {asset_rel_url}: {e}", level="warning")
-    return downloaded_assets_paths
-
-def convert_to_pdf_weasyprint(html_path, pdf_base_name, temp_dir):
-    """Converts HTML to PDF using WeasyPrint."""
-    try:
-        from weasyprint import HTML, CSS
-        from weasyprint.fonts import FontConfiguration
-        pdf_filename = f"{pdf_base_name}.pdf"
-        pdf_path = os.path.join(temp_dir, pdf_filename)
-        update_status(f"Converting to PDF (WeasyPrint): {pdf_filename} ...", level="info")
-        html_obj = HTML(filename=html_path)
-        css = CSS(string='''
-            @page { size: A4; margin: 1.5cm; } body { font-family: sans-serif; line-height: 1.4; word-wrap: break-word; }
-            table { border-collapse: collapse; width: 100%; margin-bottom: 1em; } th, td { border: 1px solid #ddd; padding: 4px; text-align: left; vertical-align: top; }
-            th { background-color: #f2f2f2; } img { max-width: 100%; height: auto; vertical-align: middle; }
-            h1, h2, h3, h4, h5, h6 { page-break-after: avoid; } table, figure { page-break-inside: avoid; } tr, li { page-break-inside: avoid; }
-        ''')
-        font_config = FontConfiguration()
-        html_obj.write_pdf(pdf_path, stylesheets=[css], font_config=font_config)
-        if os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
-            update_status(f"PDF created: {pdf_filename}", level="success")
-            return pdf_path
-        else:
-            update_status("WeasyPrint conversion failed - no output file or file is empty", level="error")
-            if os.path.exists(pdf_path): os.remove(pdf_path)
-            return None
-    except ImportError:
-        update_status("WeasyPrint not installed.", level="error")
-        st.error("PDF Conversion Error: Install WeasyPrint (`pip install WeasyPrint`) and its system dependencies (Pango, Cairo, etc.).")
-        return None
-    except Exception as e:
-        update_status(f"Error during WeasyPrint PDF conversion: {str(e)}", level="error")
-        st.exception(e)
-        return None
+    runner = get_job_runner(); job = runner.get(job_id)
+    if job is None: st.session_state.pop('job_id', None); return
+    snapshot = job.snapshot()
+    if snapshot['heading']: st.subheader(snapshot['heading'])
+    state = snapshot['state']
+    shared = f" (shared by {snapshot['watchers']} sessions)" if snapshot['watchers'] > 1 else ""
+    st.caption(f"Job {state}{shared} · {snapshot['elapsed']:.0f}s")
+    if job.active and st.button("Cancel", key="cancel_job"):
+        runner.cancel(job); st.session_state.pop('job_id', None); st.rerun()
+    if snapshot['filings']:
+        done = sum(1 for filing in snapshot['filings'] if filing['stage'] in ('done', 'reused'))
+        st.progress(done / len(snapshot['filings']), text=f"{done} of {len(snapshot['filings'])} filing(s) started so far are ready")
+        st.markdown("\n".join(f"- {STAGE_ICONS.get(filing['stage'], '')} {filing['label']}: {filing['stage']}" for filing in snapshot['filings']))
+    if state != 'queued': show_metrics(job.metrics)
+    setup_status_area(st.container())
+    messages = snapshot['messages']
+    if len(messages) > MAX_SHOWN_MESSAGES: st.caption(f"{len(messages) - MAX_SHOWN_MESSAGES} earlier message(s) hidden")
+    for _, level, message in messages[-MAX_SHOWN_MESSAGES:]: update_status(message, level=level)
+    if not job.active:
+        if state == 'done': update_status(f"Generated {len(snapshot['result'][0])} PDF file(s). Ready for download.", level="success")
+        elif state == 'failed': update_status("No PDF files generated or error occurred.", level="warning")
+        if st.session_state.get('last_run_job') != job_id:
+            remember_job_result(snapshot); st.rerun()
 
 # --- (Keep commented out Chrome conversion code if desired) ---
 # def get_chrome_path_server(): ...
 # def convert_to_pdf_chrome(...): ...
 # ---
 
-def download_and_process(doc_url, cik, form, date_str, accession, period, ticker, cleanup_temp_files):
-    """Downloads a single filing, its assets, converts to PDF, and optionally cleans up."""
-    temp_dir_filing = tempfile.mkdtemp(prefix=f"sec_{cik}_{accession}_")
-    html_path = None; assets_paths = []; pdf_path_final = None
-    try:
-        update_status(f"Processing {form} ({period}) from {date_str}...", level="info")
-        response = requests.get(doc_url, headers=HEADERS, timeout=30)
-        response.raise_for_status()
-        try: decoded_text = response.content.decode('utf-8')
-        except UnicodeDecodeError:
-            try: decoded_text = response.content.decode('iso-8859-1'); update_status(f"Decoded {doc_url} using iso-8859-1", level="info")
-            except UnicodeDecodeError: decoded_text = response.content.decode('cp1252', errors='replace'); update_status(f"Decoded {doc_url} using cp1252 (replacements)", level="warning")
-        replacements = { "â€": "\"", "â€œ": "\"", "â€™": "'", "â€˜": "'", "â€“": "-", "â€”": "-" }
-        for wrong, correct in replacements.items(): decoded_text = decoded_text.replace(wrong, correct)
-        soup = BeautifulSoup(decoded_text, 'html.parser')
-        meta_charset = soup.find('meta', charset=True)
-        if not meta_charset:
-             meta = soup.new_tag('meta', charset='UTF-8')
-             if soup.head: soup.head.insert(0, meta)
-             else: head = soup.new_tag('head'); head.append(meta); soup.insert(0, head) # Simplified head creation
-        elif meta_charset['charset'].lower() != 'utf-8': meta_charset['charset'] = 'UTF-8'
-        assets_paths = download_assets(soup, doc_url, temp_dir_filing)
-        html_filename = f"{cik}_{form}_{date_str}_{accession}.html"
-        html_path = os.path.join(temp_dir_filing, html_filename)
-        with open(html_path, 'w', encoding='utf-8') as f: f.write(str(soup))
-        pdf_base_name = f"{ticker}_{period}" if ticker else f"{cik}_{period}"
-        pdf_path_temp = convert_to_pdf_weasyprint(html_path, pdf_base_name, temp_dir_filing)
-        if pdf_path_temp: pdf_path_final = pdf_path_temp
-        return pdf_path_final
-    except requests.exceptions.Timeout: update_status(f"Timeout downloading main HTML {doc_url}", level="error"); return None
-    except requests.exceptions.RequestException as e: update_status(f"Network error downloading {doc_url}: {e}", level="error"); return None
-    except Exception as e: update_status(f"Error processing filing {accession}: {e}", level="error"); st.exception(e); return None
-    finally:
-        should_cleanup = cleanup_temp_files or (pdf_path_final is None)
-        if should_cleanup:
-            try:
-                if temp_dir_filing and os.path.exists(temp_dir_filing): shutil.rmtree(temp_dir_filing, ignore_errors=True)
-            except Exception as e: update_status(f"Error during cleanup for {accession}: {e}", level="warning")
-        # No message if temp files kept intentionally via cleanup=False
-
-def process_filings_for_cik(cik, ticker, fiscal_year_end_month, fy_adjust, cleanup_temp_files):
-    """Fetches filing list and processes 10-K/10-Q forms."""
-    parent_temp_dir = tempfile.mkdtemp(prefix="sec_pdfs_run_")
-    generated_pdf_final_paths = []
-    try:
-        cik_padded = cik.zfill(10)
-        base_url = f"https://www.sec.gov/Archives/edgar/data/{cik_padded}/"
-        submissions_url = f"https://data.sec.gov/submissions/CIK{cik_padded}.json"
-        update_status(f"Fetching filing list for CIK {cik_padded}...", level="info")
-        response = requests.get(submissions_url, headers=HEADERS, timeout=20)
-        response.raise_for_status(); data = response.json()
-        if 'filings' not in data or 'recent' not in data['filings']:
-             update_status(f"No recent filings found for CIK {cik_padded}.", level="error"); return [], None
-        filings = data['filings']['recent']
-        company_name = data.get('name', f"CIK {cik_padded}")
-        st.subheader(f"Processing Filings for: {company_name}")
-        if not ticker and data.get('tickers') and isinstance(data['tickers'], list) and len(data['tickers']) > 0:
-            ticker = data['tickers'][0]; update_status(f"Using ticker '{ticker}' from SEC data.", level="info")
-        limit_counter = 0; max_filings_to_process = 20 # Limit processing per run
-        if not all(key in filings for key in ['form', 'filingDate', 'accessionNumber', 'primaryDocument']):
-            update_status("Filings data missing expected keys.", level="error"); return [], None
-        for idx, form in enumerate(filings['form']):
-            if idx >= len(filings['filingDate']) or idx >= len(filings['accessionNumber']) or idx >= len(filings['primaryDocument']): continue
-            if limit_counter >= max_filings_to_process: update_status(f"Reached processing limit ({max_filings_to_process}).", level="warning"); break
-            if form in ['10-K', '10-Q']:
-                filing_date_str = filings['filingDate'][idx]
-                try: filing_date = datetime.strptime(filing_date_str, "%Y-%m-%d")
-                except ValueError: update_status(f"Invalid date format: {filing_date_str}", level="warning"); continue
-                period = get_filing_period(form, filing_date, fiscal_year_end_month, fy_adjust)
-                if period.startswith("ERR"): update_status(f"Skipping {form} from {filing_date_str} (period error).", level="warning"); continue
-                try: # Optional: Skip older filings
-                    year_digits = ''.join(filter(str.isdigit, period[-2:]))
-                    reported_year_check = int(year_digits) + 2000
-                    if reported_year_check < 2017: update_status(f"Skipping {form} ({period}) - Older than FY17.", level="info"); continue
-                except ValueError: update_status(f"Could not parse year from period '{period}'.", level="warning")
-                accession = filings['accessionNumber'][idx].replace('-', '')
-                doc_file = filings['primaryDocument'][idx]
-                if not doc_file or '..' in doc_file or '/' in doc_file or '\\' in doc_file:
-                    update_status(f"Invalid doc name '{doc_file}' for {accession}.", level="warning"); continue
-                doc_url = f"{base_url}{accession}/{doc_file}"
-                pdf_path_temp = download_and_process(doc_url, cik_padded, form, filing_date_str, accession, period, ticker, cleanup_temp_files)
-                if pdf_path_temp and os.path.exists(pdf_path_temp):
-                    try:
-                        final_pdf_name = os.path.basename(pdf_path_temp)
-                        final_pdf_path = os.path.join(parent_temp_dir, final_pdf_name)
-                        counter = 1
-                        while os.path.exists(final_pdf_path): # Avoid overwrites
-                             name, ext = os.path.splitext(final_pdf_name); final_pdf_path = os.path.join(parent_temp_dir, f"{name}_{counter}{ext}"); counter += 1
-                        shutil.move(pdf_path_temp, final_pdf_path)
-                        generated_pdf_final_paths.append(final_pdf_path)
-                        limit_counter += 1
-                        source_temp_dir = os.path.dirname(pdf_path_temp)
-                        if cleanup_temp_files and os.path.exists(source_temp_dir):
-                             try: shutil.rmtree(source_temp_dir, ignore_errors=True)
-                             except Exception: pass
-                    except Exception as move_err: update_status(f"Error moving PDF {os.path.basename(pdf_path_temp)}: {move_err}", level="error")
-    except requests.exceptions.Timeout: update_status(f"Timeout fetching submission data for CIK {cik}", level="error")
-    except requests.exceptions.RequestException as e: update_status(f"Network error fetching submission data: {e}", level="error")
-    except KeyError as e: update_status(f"Data parsing error (KeyError): {e}.", level="error")
-    except Exception as e: update_status(f"Unexpected error: {e}", level="error"); st.exception(e)
-    if not generated_pdf_final_paths and os.path.exists(parent_temp_dir):
-         shutil.rmtree(parent_temp_dir, ignore_errors=True) # Clean up parent dir if no files were successfully processed
-    # Return list of final PDF paths and the parent directory they reside in
-    return generated_pdf_final_paths, parent_temp_dir if generated_pdf_final_paths else None
+def offer_file_download(label, path, file_name, mime, key):
+    """Download button that opens `path` only when clicked (deferred download data)."""
+    st.download_button(label=label, data=deferred_file(path), file_name=file_name, mime=mime, key=key)
 
 # --- Streamlit UI ---
 
@@ -304,6 +164,11 @@ with col1:
     cik_input = st.text_input("Company CIK:", key="cik", placeholder="e.g., 1049502")
     ticker_input = st.text_input("Ticker (Optional, for PDF filename):", key="ticker", placeholder="e.g., MRNA")
     cleanup_input = st.checkbox("Delete intermediate HTML/Asset files", value=True, key="cleanup", help="Delete temporary HTML/CSS/images after PDF generation.")
+    low_memory_input = st.checkbox("Low-memory mode for all filings", value=False, key="low_memory", help=f"Stream every filing through disk instead of parsing it in memory. Filings over {STREAMING_INGEST_THRESHOLD_BYTES // (1024 * 1024)} MB always use this mode.")
+    incremental_input = st.checkbox("Incremental (only process new filings)", value=False, key="incremental", help="Keep PDFs between runs and only download/convert filings not processed before.")
+    workers_input = st.number_input("Parallel workers:", min_value=1, max_value=16, value=DEFAULT_PIPELINE_WORKERS, step=1, key="workers", help="Filings processed concurrently. 1 = one at a time. SEC requests stay under 10/s regardless.")
+    slim_input = st.checkbox("Slim documents before rendering", value=False, key="slim", help="Drop hidden inline-XBRL content and downsample very large images. Faster, smaller PDFs; the visible text is unchanged.")
+    sections_input = st.multiselect("Only render these Items (optional):", SECTION_CHOICES, key="sections", help="e.g. 1A (Risk Factors), 7 (MD&A), 8 (Financial Statements). Empty = whole document. Implies slimming.")
 with col2:
     months = [datetime(2000, i, 1).strftime('%B') for i in range(1, 13)]
     default_month_name = "December"; default_month_index = months.index(default_month_name) if default_month_name in months else len(months) - 1
@@ -315,58 +180,62 @@ st.markdown("---")
 # Placeholder for status messages
 if 'status_container' not in st.session_state: st.session_state.status_container = st.container()
 
-# Button to trigger processing
-if st.button("Fetch and Convert Filings", key="fetch_button"):
-    generated_files = [] # List to hold paths of generated PDFs
-    pdf_parent_dir = None # Directory containing the final PDFs
-    st.session_state.status_container.empty() # Clear previous messages
-    with st.session_state.status_container:
-        setup_status_area() # Connects _status_area to the container
-        if not cik_input or not cik_input.isdigit():
-            update_status("CIK must be a non-empty number.", level="error")
-        else:
-            with st.spinner(f"Processing filings for CIK {cik_input}..."):
-                fy_month_to_use = st.session_state.get('fy_month_input', 12) # Retrieve month
-                # Process filings returns list of paths and the directory they are in
-                generated_files, pdf_parent_dir = process_filings_for_cik(
-                    cik_input.strip(), ticker_input.strip().upper(),
-                    fy_month_to_use, fy_adjust_input, cleanup_input
-                )
-            # Final status message after spinner
-            if not generated_files: update_status("No PDF files generated or error occurred.", level="warning")
-            else: update_status(f"Generated {len(generated_files)} PDF file(s). Ready for download.", level="success")
+if METRICS_PORT: # Once per server process (cached resource)
+    _, metrics_error = start_metrics_endpoint(int(METRICS_PORT))
+    if metrics_error:
+        with st.session_state.status_container:
+            setup_status_area(); update_status(metrics_error, level="warning")
 
-    # Display download buttons only if files were generated successfully
-    if generated_files and pdf_parent_dir:
+# Button to start a background job (runs off the script thread; reruns just re-render its state)
+if st.button("Fetch and Convert Filings", key="fetch_button"):
+    if not cik_input or not cik_input.isdigit():
+        with st.session_state.status_container:
+            setup_status_area(); update_status("CIK must be a non-empty number.", level="error")
+    else:
+        runner = get_job_runner()
+        slim_options = dict(sections=sections_input or None) if (slim_input or sections_input) else None
+        job = runner.submit(cik_input.strip(), ticker_input.strip().upper(), st.session_state.get('fy_month_input', 12), fy_adjust_input,
+                            cleanup_input, incremental=incremental_input, max_workers=int(workers_input),
+                            streaming_ingest=True if low_memory_input else None, slim=slim_options)
+        previous = runner.get(st.session_state.get('job_id'))
+        if previous is not None: runner.cancel(previous) # Stop watching the old job (or drop the duplicate watch on this one)
+        st.session_state.job_id = job.id
+        st.session_state.pop('last_run', None)
+
+# Progress of this session's job (live while it runs)
+if st.session_state.get('job_id'):
+    job = get_job_runner().get(st.session_state.job_id)
+    if job is None: st.session_state.pop('job_id', None)
+    elif hasattr(st, 'fragment'): st.fragment(show_job, run_every=1.0 if job.active else None)(job.id)
+    else: # Streamlit without fragments: poll with full reruns
+        show_job(job.id)
+        if job.active: time.sleep(1.0); st.rerun()
+
+# Display download buttons for the last successful run
+last_run = st.session_state.get('last_run')
+if last_run and os.path.isdir(last_run['pdf_parent_dir']):
+    generated_files = [p for p in last_run['files'] if p and os.path.exists(p)]
+    pdf_parent_dir = last_run['pdf_parent_dir']
+    if generated_files:
         st.markdown("---")
         st.subheader("Download Options")
         st.markdown("Click buttons to download files via your browser.")
 
-        # --- Create ZIP file in memory ---
-        zip_buffer = io.BytesIO()
-        # Create a relevant zip filename
-        zip_base_name = ticker_input.strip().upper() if ticker_input else cik_input.strip()
-        zip_filename = f"{zip_base_name}_SEC_Filings_{datetime.now().strftime('%Y%m%d_%H%M')}.zip"
+        # --- Create ZIP file on disk (once per run, reused across reruns) ---
+        zip_filename = last_run['zip_filename']
         try:
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for pdf_path in generated_files:
-                    # Ensure file exists before adding
-                    if pdf_path and os.path.exists(pdf_path):
-                        # Add file to zip using its base name (not the full temp path)
-                        zip_file.write(pdf_path, arcname=os.path.basename(pdf_path))
-            zip_buffer.seek(0) # Rewind buffer pointer
+            if not os.path.isdir(last_run['zip_dir']): raise FileNotFoundError("the job was cleaned up; fetch the filings again")
+            zip_start = time.perf_counter()
+            zip_path, zip_created = get_or_build_zip(generated_files, os.path.join(last_run['zip_dir'], zip_filename))
+            finished_job = get_job_runner().get(last_run.get('job_id'))
+            if zip_created and finished_job is not None: finished_job.metrics.record('zip', time.perf_counter() - zip_start)
 
             # --- Add Download Button for ZIP ---
-            st.download_button(
-                 label=f"Download All ({len(generated_files)}) as ZIP",
-                 data=zip_buffer, # Use the buffer directly
-                 file_name=zip_filename,
-                 mime="application/zip",
-                 key="dl_zip"
-            )
+            offer_file_download(f"Download All ({len(generated_files)}) as ZIP", zip_path, zip_filename, "application/zip", "dl_zip")
             # Add info about zip creation only if successful
-            with st.session_state.status_container:
-                update_status(f"Created {zip_filename} bundle for download.", level="info")
+            if zip_created:
+                with st.session_state.status_container:
+                    update_status(f"Created {zip_filename} bundle for download.", level="info")
         except Exception as zip_err:
             # Display error if zip creation fails
             with st.session_state.status_container:
@@ -381,19 +250,14 @@ if st.button("Fetch and Convert Filings", key="fetch_button"):
         cols = st.columns(num_cols)
         col_idx = 0
         # Store info needed for download buttons
-        st.session_state.downloadable_files_info = {os.path.basename(p): p for p in generated_files if p and os.path.exists(p)}
+        st.session_state.downloadable_files_info = {os.path.basename(p): p for p in generated_files}
 
-        # Create buttons
+        # Create buttons (files are only read when a button is clicked)
         for pdf_filename, pdf_path in st.session_state.downloadable_files_info.items():
             try:
-                # Read file bytes needed for the button
-                with open(pdf_path, "rb") as fp: pdf_bytes = fp.read()
                 # Place button in the next available column
                 with cols[col_idx % num_cols]:
-                    st.download_button(
-                        label=f"Download {pdf_filename}", data=pdf_bytes, file_name=pdf_filename,
-                        mime="application/pdf", key=f"dl_{pdf_filename}" # Unique key per button
-                    )
+                    offer_file_download(f"Download {pdf_filename}", pdf_path, pdf_filename, "application/pdf", f"dl_{pdf_filename}") # Unique key per button
                     col_idx += 1
             except Exception as e:
                  # Report error if file can't be read for download
@@ -424,6 +288,7 @@ st.caption("SEC EDGAR data via SEC APIs. PDF Conversion via WeasyPrint. Ensure U
 #                 st.toast(f"Attempted cleanup of: {parent_dir_to_clean}")
 #                 del st.session_state.pdf_parent_dir # Clear from state after cleanup
 #                 if 'downloadable_files_info' in st.session_state: del st.session_state.downloadable_files_info # Clear file list
+#                 st.session_state.pop('last_run', None)
 #             else:
 #                 st.toast("Temporary directory already removed or path invalid.")
 #         except Exception as clean_err:
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# The modules live at the repository root (no package), as in `streamlit run sec_viewer_app.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sec_pipeline
+
+
+@pytest.fixture
+def fake_filings(monkeypatch, tmp_path):
+    """
+    Replaces downloading and rendering with a fake that writes a small PDF per filing.
+    Returns (accessions processed, in order; set of accessions that should fail).
+    """
+    rendered = []; failing = set(); lock = threading.Lock()
+    def download_and_process(stage_gates=None, **job):
+        time.sleep(0.01)
+        with lock: rendered.append(job['accession'])
+        if job['accession'] in failing: return None
+        filing_dir = tmp_path / f"filing_{len(rendered)}_{job['accession']}"; filing_dir.mkdir()
+        pdf_path = filing_dir / f"TCK_{job['period']}.pdf"; pdf_path.write_bytes(b'%PDF-1.7 ' + job['accession'].encode())
+        return str(pdf_path)
+    monkeypatch.setattr(sec_pipeline, 'download_and_process', download_and_process)
+    return rendered, failing
+
+
+@pytest.fixture
+def filing_jobs(monkeypatch):
+    """Call with a count: the pipeline then sees that many 10-Q filings (newest first) instead of fetching submissions."""
+    def use(count, ticker="TCK"):
+        jobs = [dict(accession=f"{i:018d}", form='10-Q', period=f"{i % 4 + 1}Q{25 - i // 4}", date_str='2025-05-01') for i in range(count)]
+        monkeypatch.setattr(sec_pipeline, 'fetch_submissions', lambda *args, **kwargs: {})
+        monkeypatch.setattr(sec_pipeline, 'prepare_filing_jobs', lambda *args, **kwargs: ("Test Co", ticker, iter(list(jobs))))
+        return jobs
+    return use
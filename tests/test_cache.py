@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""FilingCache (content-addressed blobs, LRU eviction) and PdfResultCache."""
+import hashlib
+import itertools
+import os
+import sqlite3
+import types
+
+import pytest
+
+import sec_cache
+from sec_cache import FilingCache, PdfResultCache, archive_key
+
+
+@pytest.fixture(autouse=True)
+def ticking_clock(monkeypatch):
+    """Every time.time() call in sec_cache is one second later, so LRU order never ties."""
+    ticks = itertools.count(1_000_000)
+    monkeypatch.setattr(sec_cache, 'time', types.SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def test_put_and_get(tmp_path):
+    cache = FilingCache(str(tmp_path))
+    cache.put('a', b'hello', 'text/plain')
+    assert cache.get_bytes('a') == (b'hello', 'text/plain')
+    assert cache.get('missing') is None and cache.get(None) is None
+
+
+def test_shared_content_is_stored_once(tmp_path):
+    cache = FilingCache(str(tmp_path))
+    first = cache.put('1/a/logo.png', b'x' * 100); second = cache.put('2/b/logo.png', b'x' * 100)
+    assert first == second
+    assert cache.total_bytes() == 100
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = FilingCache(str(tmp_path), max_bytes=300)
+    for key in 'abc': cache.put(key, key.encode() * 100)
+    cache.get('a') # Use order is now b, c, a
+    cache.put('d', b'd' * 100) # 400 bytes > cap: evict oldest-used first, down to 90% (270)
+    assert cache.get('b') is None and cache.get('c') is None
+    assert [cache.get_bytes(key)[0][:1] for key in 'ad'] == [b'a', b'd']
+    assert cache.total_bytes() == 200
+    assert not os.path.exists(cache._blob_path(hashlib.sha256(b'b' * 100).hexdigest()))
+
+
+def test_eviction_keeps_blobs_still_referenced(tmp_path):
+    cache = FilingCache(str(tmp_path), max_bytes=250)
+    cache.put('old', b's' * 100); cache.put('other', b'o' * 100)
+    cache.put('new', b's' * 100) # Same blob as 'old'
+    cache.put('more', b'm' * 100) # 300 bytes > cap: 'old' goes (blob kept), then 'other'
+    assert cache.get('old') is None and cache.get('other') is None # Evicted entries ...
+    assert cache.get_bytes('new') == (b's' * 100, None) # ... but its blob is still served for the other key
+
+
+def test_forgets_entries_whose_blob_was_deleted(tmp_path):
+    cache = FilingCache(str(tmp_path))
+    os.remove(cache.put('a', b'data'))
+    assert cache.get('a') is None
+
+
+def test_archive_key():
+    assert archive_key('https://www.sec.gov/Archives/edgar/data/0000320193/000032019325000001/a10-k.htm') == '320193/000032019325000001/a10-k.htm'
+    assert archive_key('https://www.sec.gov/Archives/edgar/data/320193/000032019325000001/a.htm?x=1') is None
+    assert archive_key('https://www.sec.gov/Archives/edgar/data/320193/000032019325000001/../b.htm') is None
+    assert archive_key('https://data.sec.gov/submissions/CIK0000320193.json') is None
+
+
+def test_pdf_cache_reports_the_render_time_a_hit_saved(tmp_path):
+    pdf = tmp_path / 'in.pdf'; pdf.write_bytes(b'%PDF-1.7')
+    pdf_cache = PdfResultCache(FilingCache(str(tmp_path / 'cache')))
+    assert pdf_cache.fetch('fp', str(tmp_path / 'miss.pdf')) is None
+    pdf_cache.store_pdf('fp', str(pdf), 7.5)
+    fresh = PdfResultCache(pdf_cache.store) # A later process: no renders of its own
+    assert fresh.fetch('fp', str(tmp_path / 'hit.pdf')) == 7.5
+    assert (tmp_path / 'hit.pdf').read_bytes() == b'%PDF-1.7'
+    assert fresh.stats() == dict(hits=1, misses=0, render_seconds=0.0, saved_seconds=7.5)
+    assert pdf_cache.store.get('pdf/fp')[1] == 'application/pdf'
+
+
+def test_index_from_before_render_seconds_is_migrated(tmp_path):
+    db = sqlite3.connect(str(tmp_path / 'index.sqlite3'))
+    db.execute("CREATE TABLE entries (key TEXT PRIMARY KEY, digest TEXT NOT NULL, content_type TEXT, last_access REAL NOT NULL)")
+    db.commit(); db.close()
+    cache = FilingCache(str(tmp_path))
+    cache.put('a', b'data')
+    assert cache.render_seconds('a') is None
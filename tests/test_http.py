@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""RateGovernor (token bucket with AIMD rate) and sec_get's retry handling, on a fake clock."""
+import types
+from email.utils import formatdate
+
+import pytest
+
+import sec_http
+from sec_http import RateGovernor, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self): self.now = 1_000_000.0; self.sleeps = []
+    def time(self): return self.now
+    def sleep(self, seconds): self.sleeps.append(seconds); self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sec_http, 'time', types.SimpleNamespace(time=clock.time, sleep=clock.sleep))
+    return clock
+
+
+def _send_times(governor, clock, count):
+    times = []
+    for _ in range(count):
+        governor.acquire(); times.append(clock.now)
+    return times
+
+
+def test_no_burst_on_cold_start(clock):
+    governor = RateGovernor(8)
+    times = _send_times(governor, clock, 20)
+    for start in times: # No one-second window holds more than burst + rate requests
+        assert sum(1 for t in times if start <= t < start + 1) <= 1 + 8
+    assert times[1] - times[0] == pytest.approx(1 / 8)
+
+
+def test_idle_time_does_not_build_a_burst(clock):
+    governor = RateGovernor(8)
+    governor.acquire(); clock.now += 60
+    times = _send_times(governor, clock, 3)
+    assert times[1] - times[0] == pytest.approx(1 / 8)
+
+
+def test_throttle_halves_rate_once_per_second_down_to_the_floor(clock):
+    governor = RateGovernor(8, min_rate=1)
+    governor.throttled(); assert governor.rate == pytest.approx(4)
+    governor.throttled(); assert governor.rate == pytest.approx(4) # Same burst of 429s: one event
+    for expected in (2, 1, 1):
+        clock.now += 1.0; governor.throttled()
+        assert governor.rate == pytest.approx(expected)
+    assert governor.throttle_events == 5
+
+
+def test_successes_raise_rate_up_to_the_ceiling(clock):
+    governor = RateGovernor(8, increase=0.5)
+    governor.throttled() # 4 req/s
+    for _ in range(3): governor.succeeded()
+    assert governor.rate == pytest.approx(5.5)
+    for _ in range(20): governor.succeeded()
+    assert governor.rate == pytest.approx(8)
+
+
+def test_retry_after_pauses_every_caller(clock):
+    governor = RateGovernor(8)
+    governor.throttled(retry_after=5)
+    start = clock.now; governor.acquire()
+    assert clock.now - start >= 5
+    governor.throttled(retry_after=10_000) # Capped at MAX_RETRY_AFTER
+    start = clock.now; governor.acquire()
+    assert clock.now - start == pytest.approx(sec_http.MAX_RETRY_AFTER, abs=1)
+
+
+def test_state_file_shares_the_budget(clock, tmp_path):
+    path = str(tmp_path / 'rate.json')
+    first, second = RateGovernor(8, state_file=path), RateGovernor(8, state_file=path)
+    first.acquire(); start = clock.now
+    second.acquire() # The token was spent by the other governor
+    assert clock.now - start == pytest.approx(1 / 8)
+    first.throttled()
+    assert second.rate == pytest.approx(4)
+
+
+def test_parse_retry_after(clock):
+    assert parse_retry_after('120') == 120.0
+    assert parse_retry_after(formatdate(clock.now + 30, usegmt=True)) == pytest.approx(30)
+    assert parse_retry_after('soon') is None and parse_retry_after(None) is None
+
+
+class _Response:
+    def __init__(self, status_code, headers=None): self.status_code = status_code; self.headers = headers or {}
+    def close(self): pass
+
+
+@pytest.fixture
+def governor(monkeypatch, clock):
+    governor = RateGovernor(8, increase=1.0)
+    governor.throttled(); clock.now += 1.0 # Start at 4 req/s so increases are visible
+    monkeypatch.setattr(sec_http, 'SEC_RATE_LIMITER', governor)
+    monkeypatch.setattr(sec_http, 'backoff_delay', lambda attempt: 0.0)
+    return governor
+
+
+def _serve(monkeypatch, responses):
+    responses = iter(responses)
+    monkeypatch.setattr(sec_http, 'get_http_client', lambda: types.SimpleNamespace(get=lambda url, **kwargs: next(responses)))
+
+
+def test_sec_get_server_errors_do_not_raise_the_rate(monkeypatch, governor):
+    _serve(monkeypatch, [_Response(502), _Response(500), _Response(200)])
+    assert sec_http.sec_get('https://www.sec.gov/x').status_code == 200
+    assert governor.rate == pytest.approx(5) # Only the final 200 counted
+    assert governor.retries == 2
+
+
+def test_sec_get_honours_retry_after_on_429(monkeypatch, governor, clock):
+    _serve(monkeypatch, [_Response(429, {'Retry-After': '7'}), _Response(200)])
+    start = clock.now
+    assert sec_http.sec_get('https://www.sec.gov/x').status_code == 200
+    assert clock.now - start >= 7
+    assert governor.rate == pytest.approx(3) # Halved to 2, then +1 for the 200
+
+
+def test_sec_get_returns_the_last_response_when_retries_run_out(monkeypatch, governor):
+    _serve(monkeypatch, [_Response(503)] * 3)
+    assert sec_http.sec_get('https://www.sec.gov/x', retries=2).status_code == 503
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""FilingManifest, and incremental sync reusing or replacing what it records."""
+import os
+import sqlite3
+
+import pytest
+
+import sec_pipeline
+from sec_manifest import FilingManifest, options_fingerprint
+
+CIK = '0000000001'
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = FilingManifest(str(tmp_path / 'library' / 'manifest.sqlite3'))
+    yield manifest
+    manifest.close()
+
+
+def _pdf(path):
+    path.parent.mkdir(parents=True, exist_ok=True); path.write_bytes(b'%PDF-1.7')
+    return str(path)
+
+
+def test_processed_only_lists_existing_pdfs_made_with_the_same_options(manifest, tmp_path):
+    options = options_fingerprint(ticker='TCK', slim=None)
+    manifest.record('1', 'a', '10-K', '2025-02-01', 'FY24', _pdf(tmp_path / 'a.pdf'), options)
+    manifest.record('1', 'b', '10-Q', '2025-05-01', '1Q25', _pdf(tmp_path / 'b.pdf'), options_fingerprint(ticker='TCK', slim={'sections': ['7']}))
+    manifest.record('1', 'c', '10-Q', '2025-08-01', '2Q25', str(tmp_path / 'gone.pdf'), options)
+    assert set(manifest.processed(CIK, options)) == {'a'}
+    assert set(manifest.processed(CIK)) == {'a', 'b'} # Without options: any row whose PDF exists
+    manifest.forget(CIK, 'a')
+    assert manifest.processed(CIK, options) == {}
+
+
+def test_options_fingerprint_is_order_independent():
+    assert options_fingerprint(a=1, b=[2]) == options_fingerprint(b=[2], a=1)
+    assert options_fingerprint(a=1) != options_fingerprint(a=2)
+
+
+def test_manifest_from_before_options_is_migrated(tmp_path):
+    path = str(tmp_path / 'manifest.sqlite3')
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE filings (cik TEXT NOT NULL, accession TEXT NOT NULL, form TEXT, filing_date TEXT, period TEXT, "
+               "pdf_path TEXT NOT NULL, processed_at REAL NOT NULL, PRIMARY KEY (cik, accession))")
+    db.execute("INSERT INTO filings VALUES (?, 'a', '10-K', '2025-02-01', 'FY24', ?, 0)", (CIK, _pdf(tmp_path / 'a.pdf')))
+    db.commit(); db.close()
+    manifest = FilingManifest(path)
+    assert set(manifest.processed(CIK)) == {'a'}
+    assert manifest.processed(CIK, options_fingerprint(ticker='TCK')) == {} # Unknown options: processed again
+    manifest.close()
+
+
+def _sync(manifest, output_dir, max_filings=4, max_workers=4, **options):
+    pdf_paths, _ = sec_pipeline.sync_filings_for_cik('1', 'TCK', 12, "Same Year", True, str(output_dir), manifest, max_workers=max_workers,
+                                                     max_filings=max_filings, progress=lambda message, level="info", exc=None: None, **options)
+    return pdf_paths
+
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+def test_sync_reuses_recorded_filings(fake_filings, filing_jobs, manifest, tmp_path, max_workers):
+    rendered, _ = fake_filings
+    filing_jobs(6)
+    first = _sync(manifest, tmp_path / 'out', max_workers=max_workers)
+    assert len(first) == 4 and len(rendered) == 4
+    assert _sync(manifest, tmp_path / 'out', max_workers=max_workers) == first
+    assert len(rendered) == 4 # Nothing rendered again
+
+
+def test_sync_keeps_new_renders_when_reused_filings_fill_the_quota(fake_filings, filing_jobs, manifest, tmp_path):
+    rendered, _ = fake_filings
+    jobs = filing_jobs(8)
+    for i in (1, 3): # Older runs already produced filings 1 and 3
+        manifest.record('1', jobs[i]['accession'], '10-Q', jobs[i]['date_str'], jobs[i]['period'], _pdf(tmp_path / 'out' / f"old{i}.pdf"),
+                        options_fingerprint(fiscal_year_end_month=12, fy_adjust="Same Year", ticker='TCK', slim=None))
+    pdf_paths = _sync(manifest, tmp_path / 'out')
+    assert [os.path.basename(path) for path in pdf_paths] == ['TCK_1Q25.pdf', 'old1.pdf', 'TCK_3Q25.pdf', 'old3.pdf']
+    assert sorted(rendered) == [jobs[0]['accession'], jobs[2]['accession']]
+    assert all(os.path.exists(path) for path in pdf_paths)
+    assert set(manifest.processed(CIK)) == {jobs[i]['accession'] for i in range(4)}
+
+
+def test_sync_fills_the_slot_of_a_failed_filing(fake_filings, filing_jobs, manifest, tmp_path):
+    rendered, failing = fake_filings
+    jobs = filing_jobs(8)
+    failing.add(jobs[1]['accession'])
+    pdf_paths = _sync(manifest, tmp_path / 'out')
+    assert [os.path.basename(path) for path in pdf_paths] == [f"TCK_{jobs[i]['period']}.pdf" for i in (0, 2, 3, 4)]
+    assert jobs[1]['accession'] not in manifest.processed(CIK)
+
+
+def test_sync_replaces_pdfs_made_with_other_options(fake_filings, filing_jobs, manifest, tmp_path):
+    rendered, _ = fake_filings
+    filing_jobs(2)
+    first = _sync(manifest, tmp_path / 'out')
+    second = _sync(manifest, tmp_path / 'out', slim={'sections': ['7']})
+    assert len(rendered) == 4 # Both filings rendered again
+    assert [os.path.basename(path) for path in second] == [os.path.basename(path) for path in first] # Old PDFs replaced, not suffixed
+    assert sorted(os.listdir(tmp_path / 'out')) == sorted(os.path.basename(path) for path in second)
+    assert _sync(manifest, tmp_path / 'out', slim={'sections': ['7']}) == second
+    assert len(rendered) == 4
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""process_filings_for_cik with downloading and rendering faked (see conftest)."""
+import os
+
+import pytest
+
+import sec_pipeline
+
+
+def _run(max_filings, max_workers=4):
+    messages = []
+    pdf_paths, _ = sec_pipeline.process_filings_for_cik('1', 'TCK', 12, "Same Year", True, max_workers=max_workers, max_filings=max_filings,
+                                                        progress=lambda message, level="info", exc=None: messages.append((level, message)))
+    return pdf_paths, messages
+
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+def test_stops_at_limit_without_extra_renders(fake_filings, filing_jobs, max_workers):
+    rendered, _ = fake_filings
+    filing_jobs(30)
+    pdf_paths, messages = _run(max_filings=4, max_workers=max_workers)
+    assert len(pdf_paths) == 4
+    assert len(rendered) == 4
+    assert ('warning', "Reached processing limit (4).") in messages
+
+
+def test_failed_filing_frees_its_slot(fake_filings, filing_jobs):
+    rendered, failing = fake_filings
+    jobs = filing_jobs(30)
+    failing.add(jobs[1]['accession'])
+    pdf_paths, _ = _run(max_filings=4)
+    assert [os.path.basename(path) for path in pdf_paths] == [f"TCK_{jobs[i]['period']}.pdf" for i in (0, 2, 3, 4)]
+    assert len(rendered) == 5
+
+
+def test_no_limit_warning_when_nothing_is_left(fake_filings, filing_jobs):
+    filing_jobs(4)
+    pdf_paths, messages = _run(max_filings=4)
+    assert len(pdf_paths) == 4
+    assert not any("processing limit" in message for _, message in messages)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""select_filings must label every filing exactly like sec_pipeline.get_filing_period."""
+import sys
+from datetime import date
+
+import pytest
+
+from sec_pipeline import get_filing_period
+from sec_selection import history_page_needed, select_filings
+
+
+def _columns(rows):
+    """Submissions-style parallel columns from (form, filing date) rows."""
+    return dict(form=[form for form, _ in rows], filingDate=[day for _, day in rows],
+                accessionNumber=[f"0000000001-{i // 100:02d}-{i:06d}" for i in range(len(rows))],
+                primaryDocument=[f"doc{i}.htm" for i in range(len(rows))])
+
+
+ROWS = [(form, date(year, month, 15).isoformat()) for year in (2016, 2019, 2024) for month in range(1, 13) for form in ('10-K', '10-Q')]
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def engine(request, monkeypatch):
+    if request.param == 'numpy': pytest.importorskip('numpy')
+    else: monkeypatch.setitem(sys.modules, 'numpy', None) # `import numpy` raises ImportError
+    return request.param
+
+
+@pytest.mark.parametrize('fy_adjust', ["Same Year", "Previous Year"])
+@pytest.mark.parametrize('fiscal_year_end_month', range(1, 13))
+def test_labels_match_get_filing_period(engine, fiscal_year_end_month, fy_adjust):
+    quiet = lambda message, level="info", exc=None: None
+    selected = select_filings(_columns(ROWS), fiscal_year_end_month, fy_adjust, min_fiscal_year=None)
+    assert len(selected) == len(ROWS)
+    for (form, day), (selected_form, selected_day, _, label, _) in zip(ROWS, selected):
+        assert (selected_form, selected_day) == (form, day)
+        assert label == get_filing_period(form, date.fromisoformat(day), fiscal_year_end_month, fy_adjust, quiet), (form, day)
+
+
+def test_filters_forms_dates_and_fiscal_years(engine):
+    rows = [('10-K', '2024-02-15'), ('8-K', '2024-03-01'), ('10-Q', 'not a date'), ('10-Q', '2023-08-01'), ('10-K', '2016-02-15')]
+    messages = []
+    selected = select_filings(_columns(rows), 12, "Same Year", min_fiscal_year=2017, start_date='2023-01-01',
+                              progress=lambda message, level="info", exc=None: messages.append(level))
+    assert [(form, day, label) for form, day, _, label, _ in selected] == [('10-K', '2024-02-15', 'FY23'), ('10-Q', '2023-08-01', '1Q23')]
+    assert selected[0][2] == '000000000100000000' and selected[0][4] == 'doc0.htm'
+    assert 'warning' in messages # The invalid date is reported
+
+
+def test_rejects_unsafe_document_names(engine):
+    columns = _columns([('10-K', '2024-02-15'), ('10-K', '2023-02-15')])
+    columns['primaryDocument'] = ['../etc/passwd', 'ok.htm']
+    assert [doc for *_, doc in select_filings(columns, 12, "Same Year")] == ['ok.htm']
+
+
+def test_history_page_needed():
+    page = {'filingFrom': '2010-01-01', 'filingTo': '2012-12-31'}
+    assert history_page_needed(page, min_fiscal_year=2010)
+    assert not history_page_needed(page, min_fiscal_year=2017)
+    assert not history_page_needed(page, min_fiscal_year=None, start_date='2013-01-01')
+    assert history_page_needed(page, min_fiscal_year=None, start_date='2012-06-01', end_date='2014-01-01')
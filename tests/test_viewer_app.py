@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Renders parts of the Streamlit app with streamlit.testing (no browser or server)."""
+import os
+
+import pytest
+
+pytest.importorskip("streamlit")
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _metrics_panel_app(root):
+    import sys
+    sys.path.insert(0, root)
+    from sec_metrics import RunMetrics
+    from sec_viewer_app import show_metrics
+    metrics = RunMetrics('320193')
+    filing = metrics.filing('000032019325000001', '10-K FY25 (2025-11-01)')
+    for stage in ('html_download', 'assets', 'asset_fetch', 'render', 'filing'): filing.record(stage, 0.5)
+    filing.add_bytes('html', 2048); filing.cache_lookup('pdf', True, 3.0)
+    filing.finish('done'); metrics.finish()
+    show_metrics(metrics)
+
+
+def test_metrics_panel_renders_filing_rows():
+    at = AppTest.from_function(_metrics_panel_app, args=(ROOT,), default_timeout=30)
+    at.run()
+    assert not at.exception
+    expander = at.expander[-1]
+    assert expander.label == "Metrics"
+    filings = expander.dataframe[1].value
+    assert list(filings['filing']) == ['10-K FY25 (2025-11-01)']
+    assert {'assets', 'filing s', 'assets s', 'render s'} <= set(filings.columns)